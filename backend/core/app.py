@@ -1,9 +1,12 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import os
+import queue
 from datetime import datetime
 
 from core.server_manager import ServerManager
+from core.log_streams import END_OF_STREAM
 
 app = Flask(__name__)
 CORS(app)
@@ -11,9 +14,11 @@ CORS(app)
 # Initialize ServerManager
 # Go up one level from 'core' to 'backend_v2' to find 'data'
 base_dir = os.path.dirname(os.path.dirname(__file__))
-data_path = os.path.join(base_dir, 'data', 'master.json')
+# MASTER_STORE may point at a .db/.sqlite file to use the SQLite backend instead
+data_path = os.environ.get('MASTER_STORE', os.path.join(base_dir, 'data', 'master.json'))
 
-sm = ServerManager(data_path)
+# Set MASTER_STORE_SHARED=1 when running several worker processes (e.g. gunicorn -w 4)
+sm = ServerManager(data_path, shared_store=os.environ.get('MASTER_STORE_SHARED') == '1')
 
 @app.route('/servers', methods=['GET'])
 def get_servers():
@@ -26,25 +31,105 @@ def get_server_pods(server_id):
     pods = sm.get_pods_for_server(server_id)
     return jsonify(pods), 200
 
+def _create_error_status(result):
+    """Maps a create_pod error to an HTTP status code (simple heuristic)."""
+    if "not found" in result["error"].lower():
+        return 404
+    elif "Insufficient" in result["error"] or "Unknown placement strategy" in result["error"]:
+        return 400
+    return 500
+
 @app.route('/create', methods=['POST'])
 def create_pod():
-    """Creates a pod on a server and updates master.json."""
+    """Creates a pod on a server and updates master.json.
+
+    With "wait": false the request is accepted immediately (202) and the pod is
+    provisioned in the background; poll /jobs/<job_id> for progress.
+    Without "server_id" the placement engine picks a server ("strategy":
+    best_fit, worst_fit, spread or gpu_affinity).
+    """
     data = request.json
     server_id = data.get('server_id')
+
+    if not data.get('wait', True):
+        result = sm.create_pod_async(server_id, data)
+        if "error" in result:
+            return jsonify(result), _create_error_status(result)
+        if result.get("status") != "accepted":
+            return jsonify(result), 400
+        return jsonify(result), 202, {'Location': f"/jobs/{result['job_id']}"}
     
     result = sm.create_pod(server_id, data)
     
     if "error" in result:
-        # Determine status code based on error message (simple heuristic)
-        if "not found" in result["error"].lower():
-            return jsonify(result), 404
-        elif "Insufficient" in result["error"]:
-            return jsonify(result), 400
-        else:
-            return jsonify(result), 500
+        return jsonify(result), _create_error_status(result)
             
     return jsonify(result), 200
 
+# Upper bound on pods per bulk request
+MAX_BULK_PODS = 500
+
+@app.route('/create/bulk', methods=['POST'])
+def create_pods_bulk():
+    """Creates a list of pods in parallel and records each in master.json as it is created.
+
+    Top-level "server_id" and "strategy" apply to items that do not set their
+    own. With "wait": false the pods are admitted, the request returns 202 and
+    /jobs/<job_id> reports one stage per pod.
+    """
+    data = request.json or {}
+    pods = data.get('pods')
+    if not isinstance(pods, list) or not pods or not all(isinstance(p, dict) for p in pods):
+        return jsonify({"error": "'pods' must be a non-empty list of objects"}), 400
+    if len(pods) > MAX_BULK_PODS:
+        return jsonify({"error": f"At most {MAX_BULK_PODS} pods per request"}), 400
+
+    defaults = {k: data[k] for k in ('server_id', 'strategy') if data.get(k)}
+    if not data.get('wait', True):
+        result = sm.create_pods_bulk_async(pods, defaults)
+        if "error" in result:
+            return jsonify(result), 500
+        if result.get("status") != "accepted":
+            return jsonify(result), 400
+        return jsonify(result), 202, {'Location': f"/jobs/{result['job_id']}"}
+
+    return jsonify(sm.create_pods_bulk(pods, defaults)), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns the status and stage progress of a background job."""
+    job = sm.get_job_status(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job), 200
+
+@app.route('/resource-validation', methods=['GET'])
+def resource_validation():
+    """Checks every server's resources for consistency (available <= total, pod requests <= total)."""
+    errors = sm.validate_resources()
+    if errors:
+        return jsonify({
+            "type": "error",
+            "message": "Resource validation failed. See details below.",
+            "details": errors
+        }), 400
+    return jsonify({"type": "success", "message": "Resource allocation is valid"}), 200
+
+@app.route('/capacity/fit', methods=['GET'])
+def capacity_fit():
+    """Lists servers that can fit the requested resources (query params cpus, ram_gb, storage_gb, gpus)."""
+    try:
+        requested = {k: float(v) for k, v in request.args.items() if k in ("cpus", "ram_gb", "storage_gb", "gpus")}
+    except ValueError:
+        return jsonify({"error": "Resource amounts must be numbers"}), 400
+    return jsonify({"requested": requested, "servers": sm.servers_that_fit(requested)}), 200
+
+@app.route('/capacity/utilization', methods=['GET'])
+def capacity_utilization():
+    """Returns allocated/total ratios per server and for the whole fleet."""
+    return jsonify(sm.utilization_summary()), 200
+
 @app.route('/update', methods=['POST'])
 def update_pod():
     """Updates a pod's image."""
@@ -76,6 +161,25 @@ def delete_pod():
         return jsonify(result), 500 # Simplified error handling for delete
         
     return jsonify(result), 200
+PROPAGATION_POLICIES = ("Foreground", "Background", "Orphan")
+
+@app.route('/delete/bulk', methods=['POST'])
+def delete_pods_bulk():
+    """Deletes a list of pods concurrently and updates master.json in one commit."""
+    data = request.json or {}
+    pods = data.get('pods')
+    if not isinstance(pods, list) or not pods or not all(isinstance(p, dict) for p in pods):
+        return jsonify({"error": "'pods' must be a non-empty list of objects"}), 400
+    if len(pods) > MAX_BULK_PODS:
+        return jsonify({"error": f"At most {MAX_BULK_PODS} pods per request"}), 400
+    policy = data.get('propagation_policy', 'Background')
+    if policy not in PROPAGATION_POLICIES:
+        return jsonify({"error": f"propagation_policy must be one of {', '.join(PROPAGATION_POLICIES)}"}), 400
+
+    default_server = data.get('server_id')
+    items = [{"server_id": default_server, **pod} for pod in pods]
+    return jsonify(sm.delete_pods_bulk(items, propagation_policy=policy)), 200
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
     """Returns logs for a specific pod."""
@@ -88,6 +192,59 @@ def get_logs():
     logs = sm.get_pod_logs(server_id, pod_id)
     return logs, 200, {'Content-Type': 'text/plain'}
 
+@app.route('/logs/since', methods=['GET'])
+def get_logs_since():
+    """Returns only the log lines written after the `since` timestamp, plus the next cursor."""
+    server_id = request.args.get('server_id')
+    pod_id = request.args.get('pod_id')
+
+    if not server_id or not pod_id:
+        return jsonify({"error": "Missing server_id or pod_id"}), 400
+
+    result = sm.get_pod_logs_since(server_id, pod_id, request.args.get('since'))
+    if "error" in result:
+        return jsonify(result), 404 if "not found" in result["error"] else 500
+    return jsonify(result), 200
+
+# Seconds between SSE keep-alive comments (also how soon a closed client is noticed)
+SSE_KEEPALIVE = 15
+
+@app.route('/logs/stream', methods=['GET'])
+def stream_logs():
+    """Streams a pod's logs as Server-Sent Events (one "data:" event per line).
+
+    Viewers of the same pod share one upstream follow stream. An "end" event
+    is sent when the container's log stream closes.
+    """
+    server_id = request.args.get('server_id')
+    pod_id = request.args.get('pod_id')
+
+    if not server_id or not pod_id:
+        return jsonify({"error": "Missing server_id or pod_id"}), 400
+
+    stream, q, error = sm.subscribe_pod_logs(server_id, pod_id)
+    if error:
+        return jsonify(error), 404 if "not found" in error["error"] else 500
+
+    def events():
+        try:
+            while True:
+                try:
+                    line = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if line is END_OF_STREAM:
+                    error = (stream.error or '').replace('\n', ' ')
+                    yield f"event: end\ndata: {error}\n\n"
+                    return
+                yield f"data: {line}\n\n"
+        finally:
+            sm.log_streams.unsubscribe(stream, q)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/scan', methods=['GET'])
 def scan_image():
     """Starts a background security scan."""
@@ -100,15 +257,102 @@ def scan_image():
     result = sm.scan_pod_image(server_id, pod_id)
     return jsonify(result), 200
 
+@app.route('/scan/fleet', methods=['POST'])
+def scan_fleet():
+    """Scans every unique pod image in master.json; the report is the result of /jobs/<job_id>."""
+    result = sm.scan_fleet()
+    if "error" in result:
+        return jsonify(result), 500
+    if result.get("status") != "accepted":
+        return jsonify(result), 400
+    return jsonify(result), 202, {'Location': f"/jobs/{result['job_id']}"}
+
+@app.route('/scan/history', methods=['GET'])
+def scan_history():
+    """Past scans of an image, newest first."""
+    image = request.args.get('image')
+    if not image:
+        return jsonify({"error": "Missing image"}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify(sm.get_scan_history(image, limit)), 200
+
+@app.route('/vulnerabilities/affected', methods=['GET'])
+def affected_pods():
+    """Pods whose image's latest scan has the given CVE and/or package."""
+    cve = request.args.get('cve')
+    pkg = request.args.get('pkg')
+    if not cve and not pkg:
+        return jsonify({"error": "Missing cve or pkg"}), 400
+    return jsonify(sm.affected_pods(cve, pkg)), 200
+
 @app.route('/scan/status', methods=['GET'])
 def scan_status():
-    """Polls the status of a background scan."""
+    """Polls the status of a background scan.
+
+    With "offset", only the log lines from that index on are returned; pass
+    the previous response's next_offset to get just the new lines.
+    """
     scan_id = request.args.get('scan_id')
     if not scan_id:
         return jsonify({"error": "Missing scan_id"}), 400
-        
-    status = sm.get_scan_status(scan_id)
+    try:
+        offset = int(request.args['offset']) if request.args.get('offset') else None
+    except ValueError:
+        return jsonify({"error": "offset must be an integer"}), 400
+
+    status = sm.get_scan_status(scan_id, offset)
     if not status:
         return jsonify({"error": "Scan not found"}), 404
-        
+
     return jsonify(status), 200
+
+@app.route('/scan/stream', methods=['GET'])
+def scan_stream():
+    """Pushes a scan's progress as Server-Sent Events.
+
+    Each new log line is a "data:" event whose id is the index of the next
+    line, so a reconnecting EventSource resumes via Last-Event-ID instead of
+    replaying. A "progress" event (JSON) is sent when the status, queue
+    position or running counts change, and a final "result" event carries
+    the report before the stream closes.
+    """
+    scan_id = request.args.get('scan_id')
+    if not scan_id:
+        return jsonify({"error": "Missing scan_id"}), 400
+    try:
+        offset = int(request.args.get('offset') or request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        return jsonify({"error": "offset must be an integer"}), 400
+
+    scan = sm.get_scan_status(scan_id, offset)
+    if not scan:
+        return jsonify({"error": "Scan not found"}), 404
+
+    def events(scan, offset):
+        last_progress = None
+        while True:
+            for i, line in enumerate(scan["logs"], start=scan["log_offset"] + 1):
+                yield f"id: {i}\ndata: {line}\n\n"
+            offset = scan["next_offset"]
+            progress = {k: scan.get(k) for k in ("status", "queue_position", "partial", "logs_dropped")}
+            if progress != last_progress:
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+                last_progress = progress
+            if scan["status"] not in ("queued", "running"):
+                yield f"event: result\ndata: {json.dumps({'status': scan['status'], 'result': scan['result']})}\n\n"
+                return
+            # The queue position moves without the scan itself changing, so re-check it more often
+            timeout = 2 if scan["status"] == "queued" else SSE_KEEPALIVE
+            updated = sm.wait_scan_update(scan_id, scan["updates"], offset, timeout)
+            if not updated:
+                yield f"event: result\ndata: {json.dumps({'status': 'error', 'result': {'error': 'Scan expired'}})}\n\n"
+                return
+            if updated["updates"] == scan["updates"] and updated.get("queue_position") == scan.get("queue_position"):
+                yield ": keep-alive\n\n"
+            scan = updated
+
+    return Response(stream_with_context(events(scan, offset)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
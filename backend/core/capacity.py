@@ -0,0 +1,156 @@
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from core.state_store import RESOURCE_KEYS
+
+BUCKETS = ("total", "allocated", "available")
+
+
+class CapacityMatrix:
+    """Columnar NumPy copy of the fleet's resources, for fleet-wide queries.
+
+    One row per server holds its total/allocated/available resources, and a
+    second, growable matrix holds the `requested` resources of every pod
+    together with the row of the server it runs on. Both are updated
+    incrementally as pods are created and deleted, so validation, "which
+    servers can fit X" and utilization summaries are each a single
+    vectorized pass instead of Python loops over servers and pods.
+    """
+
+    def __init__(self, keys=RESOURCE_KEYS, initial_pods=256):
+        self.keys = list(keys)
+        self.lock = threading.Lock()
+        self.server_ids: List[str] = []
+        self.server_names: List[str] = []
+        self.rows: Dict[str, int] = {}
+        width = len(self.keys)
+        self.resources = {bucket: np.zeros((0, width)) for bucket in BUCKETS}
+        # Which resources each server declares in its total bucket
+        self.declared = np.zeros((0, width), dtype=bool)
+        # Pod slots; freed slots are reused and marked with server row -1
+        self.pod_requested = np.zeros((initial_pods, width))
+        self.pod_server = np.full(initial_pods, -1, dtype=np.int64)
+        self.pod_slots: Dict[tuple, int] = {}
+        self.free_slots: List[int] = list(range(initial_pods - 1, -1, -1))
+
+    def _vector(self, values):
+        return [float(values.get(k, 0) or 0) for k in self.keys]
+
+    def rebuild(self, servers):
+        """Re-creates the matrix from a list of server records."""
+        with self.lock:
+            self.server_ids = [s.get("id") for s in servers]
+            self.server_names = [s.get("name") or s.get("id") for s in servers]
+            self.rows = {server_id: i for i, server_id in enumerate(self.server_ids)}
+            for bucket in BUCKETS:
+                self.resources[bucket] = np.array(
+                    [self._vector(s.get("resources", {}).get(bucket, {})) for s in servers],
+                    dtype=float).reshape(len(servers), len(self.keys))
+            self.declared = np.array(
+                [[k in s.get("resources", {}).get("total", {}) for k in self.keys] for s in servers],
+                dtype=bool).reshape(len(servers), len(self.keys))
+            self.pod_server[:] = -1
+            self.pod_slots = {}
+            self.free_slots = list(range(len(self.pod_server) - 1, -1, -1))
+            for server in servers:
+                for pod in server.get("pods", []):
+                    self._add_pod(server.get("id"), pod)
+
+    def update_server(self, server):
+        """Copies one server's resource buckets into its row (e.g. after a pod was added)."""
+        with self.lock:
+            row = self.rows.get(server.get("id"))
+            if row is None:
+                return
+            resources = server.get("resources", {})
+            for bucket in BUCKETS:
+                self.resources[bucket][row] = self._vector(resources.get(bucket, {}))
+            self.declared[row] = [k in resources.get("total", {}) for k in self.keys]
+
+    def add_pod(self, server_id, pod):
+        with self.lock:
+            self._add_pod(server_id, pod)
+
+    def _add_pod(self, server_id, pod):
+        row = self.rows.get(server_id)
+        if row is None:
+            return
+        key = (server_id, pod.get("pod_id"))
+        slot = self.pod_slots.get(key)
+        if slot is None:
+            if not self.free_slots:
+                self._grow()
+            slot = self.free_slots.pop()
+            self.pod_slots[key] = slot
+        self.pod_requested[slot] = self._vector(pod.get("requested") or {})
+        self.pod_server[slot] = row
+
+    def _grow(self):
+        size = len(self.pod_server)
+        self.pod_requested = np.vstack([self.pod_requested, np.zeros_like(self.pod_requested)])
+        self.pod_server = np.concatenate([self.pod_server, np.full(size, -1, dtype=np.int64)])
+        self.free_slots.extend(range(2 * size - 1, size - 1, -1))
+
+    def remove_pod(self, server_id, pod_id):
+        with self.lock:
+            slot = self.pod_slots.pop((server_id, pod_id), None)
+            if slot is not None:
+                self.pod_server[slot] = -1
+                self.pod_requested[slot] = 0
+                self.free_slots.append(slot)
+
+    def _pod_sums(self):
+        """Sum of requested resources per server row."""
+        sums = np.zeros((len(self.server_ids), len(self.keys)))
+        used = self.pod_server >= 0
+        np.add.at(sums, self.pod_server[used], self.pod_requested[used])
+        return sums
+
+    def validate(self) -> List[str]:
+        """Checks every server for available > total and sum of pod requests > total."""
+        with self.lock:
+            total = self.resources["total"]
+            declared = self.declared
+            over_available = (self.resources["available"] > total) & declared
+            over_requested = (self._pod_sums() > total + 1e-9) & declared
+            errors = []
+            for row, col in zip(*np.nonzero(over_available)):
+                key = self.keys[col]
+                errors.append(f"Server {self.server_names[row]}: available {key} > total {key}")
+            for row, col in zip(*np.nonzero(over_requested)):
+                key = self.keys[col]
+                errors.append(f"Server {self.server_names[row]}: sum of pod {key} > total {key}")
+            return errors
+
+    def fit(self, requested: Dict) -> List[str]:
+        """Ids of servers whose available resources can hold `requested`, roomiest CPU first."""
+        with self.lock:
+            available = self.resources["available"]
+            mask = np.all(available >= np.array(self._vector(requested)), axis=1)
+            rows = np.nonzero(mask)[0]
+            order = rows[np.argsort(-available[rows, self.keys.index("cpus")], kind="stable")]
+            return [self.server_ids[row] for row in order]
+
+    def utilization(self) -> Dict:
+        """Allocated/total ratios per server and for the whole fleet."""
+        with self.lock:
+            total = self.resources["total"]
+            allocated = self.resources["allocated"]
+            ratio = np.divide(allocated, total, out=np.zeros_like(allocated), where=total > 0)
+            fleet_total = total.sum(axis=0)
+            fleet_allocated = allocated.sum(axis=0)
+            fleet_ratio = np.divide(fleet_allocated, fleet_total,
+                                    out=np.zeros_like(fleet_allocated), where=fleet_total > 0)
+            return {
+                "fleet": {
+                    "total": dict(zip(self.keys, fleet_total.round(3).tolist())),
+                    "allocated": dict(zip(self.keys, fleet_allocated.round(3).tolist())),
+                    "utilization": dict(zip(self.keys, fleet_ratio.round(4).tolist())),
+                },
+                "servers": [
+                    {"id": server_id, "utilization": dict(zip(self.keys, ratio[row].round(4).tolist()))}
+                    for row, server_id in enumerate(self.server_ids)
+                ],
+            }
@@ -0,0 +1,45 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+
+class InterProcessLock:
+    """Exclusive lock shared across processes via fcntl.flock on a lock file.
+
+    Reentrant within a process: threads serialize on an RLock and only the
+    outermost acquire/release touches the file lock.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("Inter-process locking requires fcntl (POSIX only)")
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fh = open(path, 'a+')
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            except Exception:
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,102 @@
+import copy
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from core.persistence import RecordStore
+
+# Progress stages reported by K8sProvider.create_pod, in order
+CREATE_POD_STAGES = ["namespace", "deployment", "service", "ingress", "ready"]
+
+# Returned by a job body that will call complete_job itself later (e.g. from a callback)
+DEFERRED = object()
+
+
+class JobManager:
+    """Runs long-running provisioning work on a bounded executor and tracks progress.
+
+    Jobs that mostly wait on something else (namespace termination, DB
+    downloads) go to a separate "maintenance" pool so they never hold up
+    provisioning on the default one.
+
+    Finished jobs are evicted and archived like finished scans (see
+    RecordStore): after `ttl` seconds or beyond `max_jobs`, and read back
+    from `archive_dir` on demand.
+    """
+
+    def __init__(self, max_workers=4, maintenance_workers=2, max_jobs=200, ttl=3600, archive_dir=None,
+                 archive_ttl=7 * 24 * 3600):
+        self.records = RecordStore("job", max_jobs, ttl, archive_dir, archive_ttl)
+        self.jobs = self.records.by_id
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self.pools = {
+            "default": self.executor,
+            "maintenance": ThreadPoolExecutor(max_workers=maintenance_workers, thread_name_prefix="job-maintenance")
+        }
+
+    def submit(self, kind, fn, *args, stages=None, pool="default", **details):
+        """Queues fn(job_id, *args) on the given pool and returns the new job id immediately.
+
+        If fn returns DEFERRED the job stays running until complete_job is called.
+        """
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.records.add(job_id, {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "stage": None,
+                "stages": {name: "pending" for name in (stages or [])},
+                "result": None,
+                "created_at": datetime.now().isoformat(),
+                **details
+            })
+        self.pools[pool].submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        with self.lock:
+            self.jobs[job_id]["status"] = "running"
+            self.jobs[job_id]["started_at"] = datetime.now().isoformat()
+        try:
+            result = fn(job_id, *args)
+            if result is DEFERRED:
+                return
+            status = "error" if result.get("status") == "error" or "error" in result else "success"
+            self.complete_job(job_id, result, status=status)
+        except Exception as e:
+            self.complete_job(job_id, {"error": str(e)}, status="error")
+
+    def set_stage(self, job_id, stage, state, detail=None):
+        """Records progress of a single stage (in_progress, done, skipped or failed)."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job:
+                return
+            job["stages"][stage] = state
+            job["stage"] = stage
+            if detail:
+                job.setdefault("details", {})[stage] = detail
+
+    def complete_job(self, job_id, result, status="success"):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job:
+                return
+            job["status"] = status
+            job["result"] = result
+            job["end_time"] = datetime.now().isoformat()
+            snapshot = copy.deepcopy(job)
+            self.records.finish(job_id)
+        self.records.archive(snapshot)
+
+    def get_job(self, job_id):
+        """Returns a copy of the job, reading it back from the archive if it was evicted."""
+        with self.lock:
+            self.records.evict()
+            job = self.jobs.get(job_id)
+            if job:
+                return copy.deepcopy(job)
+        return self.records.load_archived(job_id)
@@ -0,0 +1,131 @@
+import json
+import os
+from threading import RLock as Lock
+from typing import Dict, List
+
+from core.persistence import CoalescingWriter
+
+
+class MutationJournal:
+    """Append-only, fsynced log of master.json mutations (JSON lines).
+
+    Each entry carries a monotonically increasing "seq". The snapshot records the
+    last seq folded into it, so entries that survive a crash between writing the
+    snapshot and truncating the journal are skipped on replay.
+
+    Appends are group-committed: entries arriving within flush_window seconds
+    are written and fsynced together. flush() is the durability barrier.
+    """
+
+    def __init__(self, path, flush_window=0.02):
+        self.path = path
+        self.lock = Lock()
+        self._fh = None
+        self._buffer = []
+        self._written_signature = self._stat()
+        self.writer = CoalescingWriter(self._write_buffer, window=flush_window,
+                                       name=f"journal-{os.path.basename(path)}")
+
+    def _handle(self):
+        if self._fh is None or self._fh.closed:
+            self._fh = open(self.path, 'a', encoding='utf-8')
+        return self._fh
+
+    def append(self, entry: Dict) -> int:
+        """Queues one entry for the next group commit. Returns its flush generation."""
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        with self.lock:
+            self._buffer.append(line)
+        return self.writer.submit()
+
+    def flush(self, generation=None, timeout=None):
+        """Waits until the given generation (default: all appends so far) is fsynced."""
+        return self.writer.wait(generation, timeout)
+
+    def _write_buffer(self):
+        with self.lock:
+            lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            try:
+                fh = self._handle()
+                fh.write("".join(lines))
+                fh.flush()
+                os.fsync(fh.fileno())
+            except Exception:
+                # Keep the entries for the next attempt
+                self._buffer = lines + self._buffer
+                raise
+            self._written_signature = self._stat()
+
+    def read_from(self, offset=0):
+        """Returns (entries, end_offset) for the complete entries after offset.
+
+        Stops at a line without a trailing newline, which is either torn by a
+        crash or still being written.
+        """
+        with self.lock:
+            entries = []
+            end = offset
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return [], 0
+            with f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        entries.append(json.loads(raw))
+                    except ValueError:
+                        break
+                    end += len(raw)
+            return entries, end
+
+    def read(self) -> List[Dict]:
+        """Returns all complete entries. A torn trailing line from a crash is dropped."""
+        with self.lock:
+            entries, valid_bytes = self.read_from(0)
+            if valid_bytes != self.size():
+                print(f"Journal {self.path}: dropping incomplete trailing entry")
+                self.close()
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+                self._written_signature = self._stat()
+            return entries
+
+    def reset(self):
+        """Empties the journal once its entries (buffered ones included) are folded into a snapshot."""
+        with self.lock:
+            self._buffer = []
+            self.close()
+            with open(self.path, 'w') as f:
+                os.fsync(f.fileno())
+            self._written_signature = self._stat()
+        self.writer.mark_flushed()
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def signature(self):
+        """File signature, or "own" if the file is exactly as our last write left it."""
+        with self.lock:
+            current = self._stat()
+            return "own" if current == self._written_signature else current
+
+    def close(self):
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
@@ -0,0 +1,131 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from providers.log_merge import split_timestamp, timestamp_key, format_line
+
+
+class PodLogBuffer:
+    """Bounded ring buffer of one deployment's recent log lines, for cursor reads.
+
+    Lines are kept as (sort_key, pod_name, timestamp, text) in timestamp
+    order. refresh() only asks Kubernetes for what was written since the last
+    fetch (since_seconds with a little slack) and drops the lines it already
+    has, so repeated polls cost roughly the size of the new output.
+    """
+
+    def __init__(self, max_lines=2000, initial_tail=100, min_refresh=1.0, slack=2):
+        self.lines = deque(maxlen=max_lines)
+        self.initial_tail = initial_tail
+        self.min_refresh = min_refresh
+        self.slack = slack
+        self.lock = threading.Lock()
+        self.last_fetch = None
+        # Per replica: newest key stored and the texts stored under it, to drop overlap
+        self.last_keys = {}
+        self.texts_at_last_key = {}
+        # Set once the ring buffer has evicted lines
+        self.dropped = False
+
+    def refresh(self, provider, namespace, deployment_name):
+        """Fetches new lines, at most once per min_refresh seconds however many clients poll."""
+        with self.lock:
+            now = time.time()
+            if self.last_fetch is not None and now - self.last_fetch < self.min_refresh:
+                return
+            pods = provider.deployment_pods(namespace, deployment_name)
+            if self.last_fetch is None:
+                fetched = provider.read_timestamped_logs(namespace, pods, tail_lines=self.initial_tail)
+            else:
+                since = math.ceil(now - self.last_fetch) + self.slack
+                # Capped at what the buffer can hold, so a long pause or a chatty pod stays bounded
+                fetched = provider.read_timestamped_logs(namespace, pods, since_seconds=since,
+                                                         tail_lines=self.lines.maxlen)
+            self.last_fetch = now
+            new = []
+            for pod_name, lines in fetched.items():
+                new.extend(self._new_lines(pod_name, lines))
+            if new:
+                self.dropped = self.dropped or len(self.lines) + len(new) > self.lines.maxlen
+                new.sort(key=lambda entry: entry[0])
+                if self.lines and new[0][0] < self.lines[-1][0]:
+                    # Another replica wrote older lines than our newest: re-sort the tail
+                    merged = sorted(list(self.lines) + new, key=lambda entry: entry[0])
+                    self.lines.clear()
+                    self.lines.extend(merged)
+                else:
+                    self.lines.extend(new)
+
+    def _new_lines(self, pod_name, lines):
+        last_key = self.last_keys.get(pod_name, "")
+        seen = self.texts_at_last_key.setdefault(pod_name, set())
+        key = last_key
+        for line in lines:
+            sort_key, timestamp, text = split_timestamp(line)
+            # Continuation lines without a timestamp stay with the line before them
+            key = sort_key or key
+            if key < last_key or (key == last_key and line in seen):
+                continue
+            if key != last_key:
+                last_key = key
+                seen.clear()
+            seen.add(line)
+            self.last_keys[pod_name] = last_key
+            yield key, pod_name, timestamp, text
+
+    def since(self, cursor=None, tail=100):
+        """Lines newer than the cursor timestamp (or the last `tail` lines without one).
+
+        Returns (entries, cursor, truncated): truncated is True when lines
+        between the cursor and the oldest buffered line were already evicted.
+        """
+        with self.lock:
+            if not cursor:
+                entries = list(self.lines)[-tail:]
+                truncated = False
+            else:
+                cursor_key = timestamp_key(cursor)
+                entries = []
+                # Walk back from the newest line: cost is the number of new lines
+                for entry in reversed(self.lines):
+                    if entry[0] <= cursor_key:
+                        break
+                    entries.append(entry)
+                entries.reverse()
+                truncated = (self.dropped and len(entries) == len(self.lines)
+                             and bool(self.lines) and self.lines[0][0] > cursor_key)
+            new_cursor = next((e[2] for e in reversed(entries) if e[2]), cursor)
+            return entries, new_cursor, truncated
+
+
+class LogBufferRegistry:
+    """Keeps a PodLogBuffer per (server_id, pod_id), evicting the least recently used."""
+
+    def __init__(self, max_buffers=256, **buffer_kwargs):
+        self.max_buffers = max_buffers
+        self.buffer_kwargs = buffer_kwargs
+        self.lock = threading.Lock()
+        self.buffers = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = PodLogBuffer(**self.buffer_kwargs)
+                while len(self.buffers) > self.max_buffers:
+                    self.buffers.popitem(last=False)
+            else:
+                self.buffers.move_to_end(key)
+            return buffer
+
+    def drop(self, key):
+        with self.lock:
+            self.buffers.pop(key, None)
+
+
+def render(entries, tagged):
+    """Display lines: tagged with pod name and timestamp when several replicas are mixed."""
+    if tagged:
+        return [format_line(pod_name, timestamp, text) for _, pod_name, timestamp, text in entries]
+    return [text for _, _, _, text in entries]
@@ -0,0 +1,157 @@
+import queue
+import threading
+from collections import deque
+
+# Marker put on subscriber queues when the upstream stream has ended
+END_OF_STREAM = None
+
+
+class LogStream:
+    """A single upstream `follow=True` log stream fanned out to many viewers.
+
+    open_fn() returns the raw (unpreloaded) HTTP response of
+    read_namespaced_pod_log. A reader thread splits it into lines, keeps the
+    most recent ones for viewers that join later, and pushes every line onto
+    each subscriber's bounded queue. A viewer that falls behind loses its
+    oldest lines rather than stalling the others.
+    """
+
+    def __init__(self, key, open_fn, backlog=200, max_queue=1000, on_close=None):
+        self.key = key
+        self.open_fn = open_fn
+        self.max_queue = max_queue
+        self.on_close = on_close
+        self.lock = threading.Lock()
+        self.backlog = deque(maxlen=backlog)
+        self.subscribers = set()
+        self.response = None
+        self.closed = False
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name=f"log-stream-{key}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def subscribe(self):
+        """Returns a queue of lines, starting with the recent backlog."""
+        q = queue.Queue(maxsize=self.max_queue)
+        with self.lock:
+            for line in self.backlog:
+                self._offer(q, line)
+            if self.closed:
+                self._offer(q, END_OF_STREAM)
+            else:
+                self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Drops a viewer; the upstream stream is closed when the last one leaves."""
+        with self.lock:
+            self.subscribers.discard(q)
+            last = not self.subscribers
+        if last:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            response = self.response
+        self._release(response)
+
+    def _release(self, response):
+        if response is not None:
+            try:
+                # Unblocks the reader thread
+                response.close()
+            except Exception:
+                pass
+        if self.on_close:
+            self.on_close(self)
+
+    @staticmethod
+    def _offer(q, item):
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(item)
+
+    def _publish(self, line):
+        with self.lock:
+            self.backlog.append(line)
+            for q in self.subscribers:
+                self._offer(q, line)
+
+    def _run(self):
+        try:
+            response = self.open_fn()
+            with self.lock:
+                self.response = response
+                closed = self.closed
+            if closed:
+                response.close()
+                return
+            pending = b""
+            for chunk in response.stream(4096):
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    self._publish(line.decode("utf-8", errors="replace").rstrip("\r"))
+            if pending:
+                self._publish(pending.decode("utf-8", errors="replace").rstrip("\r"))
+        except Exception as e:
+            if not self.closed:
+                print(f"Log stream {self.key} failed: {e}")
+                self.error = str(e)
+        finally:
+            # Under the lock subscribe() takes: a viewer joins either before
+            # this and gets END_OF_STREAM here, or after and sees closed
+            with self.lock:
+                for q in self.subscribers:
+                    self._offer(q, END_OF_STREAM)
+                already_closed = self.closed
+                self.closed = True
+                response = self.response
+            if not already_closed:
+                self._release(response)
+
+
+class LogStreamHub:
+    """Keeps at most one upstream LogStream per key (e.g. (server_id, pod_id))."""
+
+    def __init__(self, backlog=200):
+        self.backlog = backlog
+        self.lock = threading.Lock()
+        self.streams = {}
+
+    def subscribe(self, key, open_fn):
+        """Joins the stream for key, opening it with open_fn if nobody is watching yet.
+
+        Returns (stream, queue); pass both to unsubscribe when done.
+        """
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None or stream.closed:
+                stream = LogStream(key, open_fn, backlog=self.backlog, on_close=self._forget)
+                self.streams[key] = stream
+                stream.start()
+            q = stream.subscribe()
+        return stream, q
+
+    def unsubscribe(self, stream, q):
+        stream.unsubscribe(q)
+
+    def _forget(self, stream):
+        with self.lock:
+            if self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+
+    def viewers(self, key):
+        with self.lock:
+            stream = self.streams.get(key)
+            return len(stream.subscribers) if stream else 0
@@ -0,0 +1,219 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Read once at import (os.umask can only be read by setting it, which is not thread-safe)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_json(path, data, indent=2):
+    """Writes JSON so readers see either the old or the new file, never a torn one.
+
+    The data goes to a temp file in the same directory, is fsynced, renamed over
+    the target, and the directory entry is fsynced as well. The file keeps the
+    target's permissions (a new one gets the usual 0666 minus umask) rather
+    than mkstemp's 0600.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            os.fchmod(f.fileno(), mode)
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class CoalescingWriter:
+    """Runs flush_fn on a background thread, coalescing bursts of requests.
+
+    Each submit() returns a generation number. After the first submit the
+    writer waits `window` seconds to collect more, then calls flush_fn once
+    for all of them. wait(generation) is the durability barrier: it returns
+    once a flush that started after that submit has completed.
+    """
+
+    def __init__(self, flush_fn, window=0.02, name="coalescing-writer"):
+        self.flush_fn = flush_fn
+        self.window = window
+        self.cond = threading.Condition()
+        self.submitted = 0
+        self.flushed = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self):
+        with self.cond:
+            self.submitted += 1
+            self.cond.notify_all()
+            return self.submitted
+
+    def wait(self, generation=None, timeout=None):
+        """Blocks until `generation` (default: everything submitted so far) is flushed."""
+        with self.cond:
+            if generation is None:
+                generation = self.submitted
+            if not self.cond.wait_for(lambda: self.flushed >= generation, timeout):
+                return False
+            if self.error:
+                raise self.error
+            return True
+
+    def mark_flushed(self):
+        """Declares everything submitted so far durable (e.g. folded into a snapshot)."""
+        with self.cond:
+            self.flushed = max(self.flushed, self.submitted)
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.submitted > self.flushed)
+            if self.window:
+                # Let the rest of the burst arrive before paying for the write
+                time.sleep(self.window)
+            with self.cond:
+                target = self.submitted
+            try:
+                self.flush_fn()
+                error = None
+            except Exception as e:
+                print(f"{self._thread.name}: flush failed: {e}")
+                error = e
+            with self.cond:
+                self.error = error
+                self.flushed = max(self.flushed, target)
+                self.cond.notify_all()
+
+
+class RecordStore:
+    """Finished-record eviction and archive shared by ScanManager and JobManager.
+
+    Records live in `by_id`. Finished ones are evicted once they are older
+    than `ttl` seconds or more than `max_records` records are held; records
+    that have not finished are never evicted. With an `archive_dir`, finished
+    records are written there by archive() and read back by load_archived()
+    after eviction. The archive keeps files for `archive_ttl` seconds and at
+    most `max_archived` of them: it is pruned at start and then again by
+    archive() once every `prune_interval` seconds, so a long-running backend
+    does not fill the disk.
+
+    There is no lock here: the owner calls add(), finish() and evict() under
+    its own lock, and archive()/load_archived() (file I/O) outside it.
+    """
+
+    def __init__(self, kind, max_records=200, ttl=3600, archive_dir=None, archive_ttl=7 * 24 * 3600,
+                 max_archived=5000, prune_interval=3600):
+        self.kind = kind
+        self.max_records = max_records
+        self.ttl = ttl
+        self.archive_dir = archive_dir
+        self.archive_ttl = archive_ttl
+        self.max_archived = max_archived
+        self.prune_interval = prune_interval
+        self._prune_lock = threading.Lock()
+        self._next_prune = 0
+        self.by_id = {}
+        # Finished record ids in completion order, with the time they finished
+        self.finished = OrderedDict()
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            self.prune_archive()
+
+    def add(self, record_id, record):
+        self.evict()
+        self.by_id[record_id] = record
+
+    def finish(self, record_id):
+        self.finished[record_id] = time.time()
+        self.evict()
+
+    def evict(self):
+        """Drops expired finished records, then the oldest finished ones over max_records."""
+        cutoff = time.time() - self.ttl
+        while self.finished:
+            record_id, finished_at = next(iter(self.finished.items()))
+            if finished_at > cutoff and len(self.by_id) <= self.max_records:
+                break
+            self.finished.popitem(last=False)
+            self.by_id.pop(record_id, None)
+
+    def _archive_path(self, record_id):
+        try:
+            # Ids come from URLs and query strings: only plain UUIDs map to a file
+            return os.path.join(self.archive_dir, f"{uuid.UUID(record_id)}.json")
+        except (ValueError, TypeError):
+            return None
+
+    def archive(self, snapshot):
+        if not self.archive_dir:
+            return
+        try:
+            atomic_write_json(self._archive_path(snapshot["id"]), snapshot, indent=None)
+        except Exception as e:
+            print(f"Failed to archive {self.kind} {snapshot['id']}: {e}")
+        if time.time() >= self._next_prune and self._prune_lock.acquire(blocking=False):
+            # One archiving thread prunes; the others do not wait for it
+            try:
+                if time.time() >= self._next_prune:
+                    self.prune_archive()
+            finally:
+                self._prune_lock.release()
+
+    def load_archived(self, record_id):
+        path = self._archive_path(record_id) if self.archive_dir else None
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return {**json.load(f), "archived": True}
+        except Exception as e:
+            print(f"Failed to read archived {self.kind} {record_id}: {e}")
+            return None
+
+    def prune_archive(self):
+        """Removes archived files older than archive_ttl, then the oldest ones over max_archived."""
+        self._next_prune = time.time() + self.prune_interval
+        cutoff = time.time() - self.archive_ttl
+        kept = []
+        for name in os.listdir(self.archive_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.archive_dir, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime < cutoff:
+                    os.remove(path)
+                else:
+                    kept.append((mtime, path))
+            except OSError:
+                pass
+        kept.sort()
+        for _, path in kept[:max(0, len(kept) - self.max_archived)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
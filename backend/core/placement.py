@@ -0,0 +1,148 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Optional
+
+from core.state_store import RESOURCE_KEYS
+
+STRATEGIES = ("best_fit", "worst_fit", "spread", "gpu_affinity")
+DEFAULT_STRATEGY = "best_fit"
+
+
+class CapacityIndex:
+    """Free capacity per server, kept in sorted lists for bisect range queries.
+
+    For every resource there is a list of (free[resource], free[cpus], server_id)
+    tuples, plus one list ordered by pod count for the spread strategy. Finding
+    the first server with at least N free of a resource is a bisect; updating a
+    server is a remove and an insort.
+    """
+
+    def __init__(self):
+        self.free: Dict[str, Dict[str, float]] = {}
+        self.pod_counts: Dict[str, int] = {}
+        self.by_key = {k: [] for k in RESOURCE_KEYS}
+        self.by_pods = []
+
+    def _entry(self, key, server_id):
+        free = self.free[server_id]
+        return (free[key], free["cpus"], server_id)
+
+    def update(self, server_id, free, pod_count):
+        if server_id in self.free:
+            self.remove(server_id)
+        self.free[server_id] = {k: float(free.get(k, 0)) for k in RESOURCE_KEYS}
+        self.pod_counts[server_id] = pod_count
+        for k in RESOURCE_KEYS:
+            insort(self.by_key[k], self._entry(k, server_id))
+        insort(self.by_pods, (pod_count, server_id))
+
+    def remove(self, server_id):
+        if server_id not in self.free:
+            return
+        for k in RESOURCE_KEYS:
+            entries = self.by_key[k]
+            del entries[bisect_left(entries, self._entry(k, server_id))]
+        del self.by_pods[bisect_left(self.by_pods, (self.pod_counts[server_id], server_id))]
+        del self.free[server_id]
+        del self.pod_counts[server_id]
+
+    def ascending(self, key, minimum=0.0) -> Iterable[str]:
+        """Server ids with free[key] >= minimum, tightest first."""
+        entries = self.by_key[key]
+        for i in range(bisect_left(entries, (minimum,)), len(entries)):
+            yield entries[i][2]
+
+    def descending(self, key, minimum=0.0) -> Iterable[str]:
+        """Server ids with free[key] >= minimum, roomiest first."""
+        entries = self.by_key[key]
+        for i in range(len(entries) - 1, bisect_left(entries, (minimum,)) - 1, -1):
+            yield entries[i][2]
+
+    def by_pod_count(self) -> Iterable[str]:
+        for _, server_id in self.by_pods:
+            yield server_id
+
+    def fits(self, server_id, requested) -> bool:
+        free = self.free[server_id]
+        return all(requested.get(k, 0) <= free[k] for k in RESOURCE_KEYS)
+
+
+class PlacementEngine:
+    """Picks a server for a pod from the fleet's free capacity.
+
+    Free capacity is each server's `available` resources minus what the
+    reservation ledger holds for pods still provisioning. Strategies:
+
+    - best_fit: the server with the least free CPU that still fits (packs servers).
+    - worst_fit: the server with the most free CPU (keeps headroom everywhere).
+    - spread: the server with the fewest pods (recorded plus still provisioning) that fits.
+    - gpu_affinity: GPU pods go best-fit on GPUs; other pods go to the servers
+      with the fewest free GPUs, so GPU capacity stays free for GPU pods.
+
+    Placement is advisory: admission still reserves against the server, and the
+    caller retries with the next candidate if that reservation fails.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = CapacityIndex()
+        self.available: Dict[str, Dict] = {}
+        self.held: Dict[str, Dict] = {}
+        self.pod_counts: Dict[str, int] = {}
+        self.pending: Dict[str, int] = {}
+
+    def update_server(self, server_id, server):
+        """Refreshes a server's entry from its master.json record (None removes it)."""
+        with self.lock:
+            # master.json writes "Online"/"Offline"
+            if server is None or str(server.get("status", "")).lower() == "offline":
+                self.available.pop(server_id, None)
+                self.index.remove(server_id)
+                return
+            self.available[server_id] = dict(server.get("resources", {}).get("available", {}))
+            self.pod_counts[server_id] = len(server.get("pods", []))
+            self._reindex(server_id)
+
+    def set_held(self, server_id, held, pending=0):
+        """Called by the reservation ledger whenever a server's held totals change."""
+        with self.lock:
+            self.held[server_id] = dict(held)
+            self.pending[server_id] = pending
+            if server_id in self.available:
+                self._reindex(server_id)
+
+    def rebuild(self, servers):
+        """Re-indexes the whole fleet, e.g. after a full reload of master.json."""
+        with self.lock:
+            self.index = CapacityIndex()
+            self.available = {}
+        for server in servers:
+            self.update_server(server.get("id"), server)
+
+    def _reindex(self, server_id):
+        available = self.available[server_id]
+        held = self.held.get(server_id, {})
+        free = {k: available.get(k, 0) - held.get(k, 0) for k in RESOURCE_KEYS}
+        pod_count = self.pod_counts.get(server_id, 0) + self.pending.get(server_id, 0)
+        self.index.update(server_id, free, pod_count)
+
+    def place(self, requested: Dict, strategy=DEFAULT_STRATEGY, exclude=()) -> Optional[str]:
+        """Returns the id of the server to place a pod on, or None if nothing fits."""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown placement strategy '{strategy}', expected one of {', '.join(STRATEGIES)}")
+        with self.lock:
+            for server_id in self._candidates(requested, strategy):
+                if server_id not in exclude and self.index.fits(server_id, requested):
+                    return server_id
+            return None
+
+    def _candidates(self, requested, strategy):
+        cpus = requested.get("cpus", 0)
+        if strategy == "best_fit":
+            return self.index.ascending("cpus", cpus)
+        if strategy == "worst_fit":
+            return self.index.descending("cpus", cpus)
+        if strategy == "spread":
+            return self.index.by_pod_count()
+        # gpu_affinity
+        return self.index.ascending("gpus", requested.get("gpus", 0))
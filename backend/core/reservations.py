@@ -0,0 +1,116 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from core.state_store import RESOURCE_KEYS
+
+
+class ReservationLedger:
+    """Holds resources for pods that are admitted but not yet recorded in master.json.
+
+    Admission reserves atomically against available minus everything already
+    held, so concurrent creates cannot overcommit a server during the
+    provisioning window. A reservation is committed once the pod is recorded
+    (which deducts the resources from master.json) or released on failure.
+    Reservations that are never resolved expire after their TTL.
+
+    on_change(server_id, held, pending) is called (under the ledger lock)
+    whenever a server's held totals change, with the number of reservations
+    still pending on it, so derived indexes can follow.
+    """
+
+    def __init__(self, default_ttl=600, keys=RESOURCE_KEYS, on_change=None):
+        self.default_ttl = default_ttl
+        self.keys = keys
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.reservations = {}
+        self.held = defaultdict(lambda: defaultdict(float))
+        self.pending = defaultdict(int)
+        self._expiry_heap = []
+
+    def reserve(self, server_id, pod_id, requested, available, ttl=None):
+        """Reserves requested resources for (server_id, pod_id).
+
+        Returns None on success, or an error message if the server does not
+        have enough unreserved capacity or the pod is already being provisioned.
+        """
+        key = (server_id, pod_id)
+        with self.lock:
+            self._expire()
+            if key in self.reservations:
+                return f"Pod {pod_id} is already being provisioned on {server_id}"
+            held = self.held[server_id]
+            for k in self.keys:
+                free = available.get(k, 0) - held[k]
+                if requested.get(k, 0) > free:
+                    return f"Insufficient resources (bookkeeping check): {k} requested {requested.get(k, 0)}, unreserved {round(free, 3)}"
+            expires_at = time.time() + (ttl or self.default_ttl)
+            self.reservations[key] = {"requested": dict(requested), "expires_at": expires_at}
+            for k, v in requested.items():
+                held[k] += v
+            self.pending[server_id] += 1
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            self._notify(server_id)
+            return None
+
+    def refresh(self, keys, ttl=None):
+        """Pushes back the expiry of still-held (server_id, pod_id) reservations.
+
+        Long-running provisioning (bulk batches) calls this periodically so
+        holds outlive the TTL while their pods are still queued or creating.
+        """
+        with self.lock:
+            self._expire()
+            expires_at = time.time() + (ttl or self.default_ttl)
+            for key in keys:
+                reservation = self.reservations.get(key)
+                if reservation:
+                    reservation["expires_at"] = expires_at
+                    heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    def commit(self, server_id, pod_id):
+        """Drops the hold once the pod has been recorded (and deducted) in master.json."""
+        return self._drop((server_id, pod_id))
+
+    def release(self, server_id, pod_id):
+        """Returns the held resources after a failed or abandoned admission."""
+        return self._drop((server_id, pod_id))
+
+    def _drop(self, key):
+        with self.lock:
+            reservation = self.reservations.pop(key, None)
+            if reservation:
+                self._unhold(key[0], reservation)
+            return reservation is not None
+
+    def _expire(self):
+        """Releases reservations whose TTL passed. Amortized O(1) per reservation."""
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            reservation = self.reservations.get(key)
+            # Skip heap entries for reservations already committed or re-reserved
+            if reservation and reservation["expires_at"] == expires_at:
+                print(f"Reservation for pod {key[1]} on {key[0]} expired, releasing")
+                del self.reservations[key]
+                self._unhold(key[0], reservation)
+
+    def _unhold(self, server_id, reservation):
+        held = self.held[server_id]
+        for k, v in reservation["requested"].items():
+            # Snap float residue to zero so an idle server reports nothing held
+            held[k] = round(max(0.0, held[k] - v), 6)
+        self.pending[server_id] -= 1
+        self._notify(server_id)
+
+    def _notify(self, server_id):
+        if self.on_change:
+            self.on_change(server_id, self.held[server_id], self.pending[server_id])
+
+    def held_for(self, server_id):
+        """Resources currently reserved on a server."""
+        with self.lock:
+            self._expire()
+            return dict(self.held.get(server_id, {}))
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+from core.persistence import atomic_write_json
+
+
+class TrivyDbVersion:
+    """Memoized version of the local trivy vulnerability DB (its UpdatedAt timestamp).
+
+    Cached reports are only valid for the DB they were produced with, so the
+    version is part of the cache key. `trivy version` is re-run at most once
+    per `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300, cache_dir=None):
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.value = None
+        self.checked_at = 0
+
+    def get(self):
+        with self.lock:
+            if time.time() - self.checked_at < self.ttl:
+                return self.value
+            try:
+                cmd = ["trivy", "version", "--format", "json"]
+                if self.cache_dir:
+                    cmd += ["--cache-dir", self.cache_dir]
+                out = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+                db = json.loads(out.stdout or "{}").get("VulnerabilityDB") or {}
+                self.value = db.get("UpdatedAt") or db.get("Version")
+            except Exception as e:
+                print(f"Could not read trivy DB version: {e}")
+                self.value = None
+            self.checked_at = time.time()
+            return self.value
+
+    def invalidate(self):
+        with self.lock:
+            self.checked_at = 0
+
+
+def download_trivy_db(cache_dir, timeout=600):
+    """Downloads or refreshes the vulnerability DB in cache_dir once. Returns an error string or None."""
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        out = subprocess.run(["trivy", "image", "--download-db-only", "--no-progress", "--cache-dir", cache_dir],
+                             capture_output=True, text=True, timeout=timeout)
+    except Exception as e:
+        return str(e)
+    if out.returncode != 0:
+        return (out.stderr or out.stdout).strip()[-500:] or f"trivy exited with code {out.returncode}"
+    return None
+
+
+def parse_digest(image_ref):
+    """Returns the sha256 digest in an image reference or containerStatus imageID, if any."""
+    if image_ref and "@sha256:" in image_ref:
+        return image_ref.split("@", 1)[1]
+    if image_ref and image_ref.startswith("sha256:"):
+        return image_ref
+    return None
+
+
+class ScanCache:
+    """LRU cache of parsed trivy reports keyed by (image digest, trivy DB version).
+
+    Entries expire after `ttl` seconds. Each entry is persisted as its own
+    JSON file in `directory`, so it survives restarts. A put writes only its
+    own entry, and eviction deletes files. Disk I/O happens after the lock
+    is released.
+    """
+
+    def __init__(self, directory=None, max_entries=256, ttl=24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def key(digest, db_version):
+        return f"{digest}|{db_version}"
+
+    def _file(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _load(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        loaded, stale = [], []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r') as f:
+                    entry = json.load(f)
+            except Exception as e:
+                print(f"Ignoring unreadable scan cache entry {path}: {e}")
+                stale.append(path)
+                continue
+            if now - entry.get("stored_at", 0) < self.ttl and path == self._file(entry.get("key", "")):
+                loaded.append(entry)
+            else:
+                stale.append(path)
+        loaded.sort(key=lambda entry: entry["stored_at"])
+        # Anything over max_entries (e.g. a put that raced its own eviction) goes too
+        overflow = max(0, len(loaded) - self.max_entries)
+        stale.extend(self._file(entry["key"]) for entry in loaded[:overflow])
+        for entry in loaded[overflow:]:
+            self.entries[entry["key"]] = entry
+        self._remove(stale)
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Failed to remove scan cache entry {path}: {e}")
+
+    def get(self, digest, db_version):
+        """Returns the cached report, or None on a miss or an expired entry."""
+        if not digest or not db_version:
+            return None
+        key = self.key(digest, db_version)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry["stored_at"] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry["report"]
+            expired = entry is not None
+            if expired:
+                del self.entries[key]
+            self.misses += 1
+        if expired and self.directory:
+            self._remove([self._file(key)])
+        return None
+
+    def put(self, digest, db_version, image, report):
+        if not digest or not db_version:
+            return
+        key = self.key(digest, db_version)
+        entry = {"key": key, "digest": digest, "db_version": db_version,
+                 "image": image, "stored_at": time.time(), "report": report}
+        evicted = []
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[0])
+        if not self.directory:
+            return
+        try:
+            atomic_write_json(self._file(key), entry, indent=None)
+        except Exception as e:
+            print(f"Failed to persist scan cache entry: {e}")
+        self._remove([self._file(k) for k in evicted])
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id TEXT PRIMARY KEY,
+    image TEXT NOT NULL,
+    digest TEXT,
+    db_version TEXT,
+    finished_at REAL NOT NULL,
+    total INTEGER NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    image TEXT NOT NULL,
+    cve TEXT NOT NULL,
+    pkg TEXT NOT NULL,
+    installed_version TEXT,
+    severity TEXT,
+    digest TEXT,
+    scan_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_image ON scans(image, finished_at);
+CREATE INDEX IF NOT EXISTS idx_scans_digest ON scans(digest);
+CREATE INDEX IF NOT EXISTS idx_findings_image ON findings(image);
+CREATE INDEX IF NOT EXISTS idx_findings_cve ON findings(cve);
+CREATE INDEX IF NOT EXISTS idx_findings_pkg ON findings(pkg);
+CREATE INDEX IF NOT EXISTS idx_findings_digest ON findings(digest);
+"""
+
+
+class ScanHistory:
+    """SQLite (WAL mode) history of completed scans with a vulnerability index.
+
+    Every completed scan is a row in `scans`. `findings` holds the full
+    finding list of the latest scan of each image (replaced when the image
+    is scanned again), indexed by image, CVE id, package and digest, so
+    "which images have CVE-X" is an index lookup rather than a rescan.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, scan_id, image, digest, db_version, report, findings):
+        """Stores a completed scan and makes its findings the current ones for the image."""
+        rows = [(image, cve, pkg, version, severity, digest, scan_id)
+                for cve, pkg, version, severity in findings if cve and pkg]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO scans(id, image, digest, db_version, finished_at, total, summary) "
+                    "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                    (scan_id, image, digest, db_version, time.time(), report.get("total", 0),
+                     json.dumps(report.get("summary", {})))
+                )
+                self.conn.execute("DELETE FROM findings WHERE image = ?", (image,))
+                self.conn.executemany("INSERT INTO findings VALUES(?, ?, ?, ?, ?, ?, ?)", rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def scans_for_image(self, image, limit=20):
+        """Most recent scans of an image, newest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, image, digest, db_version, finished_at, total, summary FROM scans "
+                "WHERE image = ? ORDER BY finished_at DESC LIMIT ?", (image, limit)
+            ).fetchall()
+        return [{"scan_id": r[0], "image": r[1], "digest": r[2], "db_version": r[3],
+                 "finished_at": r[4], "total": r[5], "summary": json.loads(r[6])} for r in rows]
+
+    def affected_images(self, cve=None, pkg=None):
+        """{image: [findings]} from the latest scan of each image matching the CVE and/or package."""
+        clauses, args = [], []
+        if cve:
+            clauses.append("cve = ?")
+            args.append(cve)
+        if pkg:
+            clauses.append("pkg = ?")
+            args.append(pkg)
+        if not clauses:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT image, cve, pkg, installed_version, severity, digest, scan_id FROM findings "
+                f"WHERE {' AND '.join(clauses)}", args
+            ).fetchall()
+        images = {}
+        for image, cve_id, pkg_name, version, severity, digest, scan_id in rows:
+            images.setdefault(image, []).append({
+                "cve": cve_id, "pkg": pkg_name, "installed_version": version,
+                "severity": severity, "digest": digest, "scan_id": scan_id
+            })
+        return images
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+
+
+class ScanScheduler:
+    """Runs trivy scans on a fixed number of worker threads.
+
+    Scans wait in a FIFO queue and can report their position while they
+    wait. A scan requested for an image that is already queued or running
+    attaches to that scan instead of starting another trivy process.
+    """
+
+    def __init__(self, run_fn, max_workers=2):
+        self.run_fn = run_fn
+        self.max_workers = max_workers
+        self.cond = threading.Condition()
+        self.queue = deque()
+        # key -> scan_id of the queued or running scan for that image
+        self.in_flight = {}
+        # Queue sequence numbers: position = seq - started + 1 while queued
+        self.seq = {}
+        self.enqueued = 0
+        self.started = 0
+        self.running = 0
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._work, name=f"scan-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, key, create_fn, *args):
+        """Queues run_fn(scan_id, *args) unless a scan for key is already in flight.
+
+        create_fn() creates the scan record and returns its id; it is only
+        called for a new scan. Returns (scan_id, attached).
+        """
+        with self.cond:
+            scan_id = self.in_flight.get(key)
+            if scan_id is not None:
+                return scan_id, True
+            scan_id = create_fn()
+            self.in_flight[key] = scan_id
+            self.seq[scan_id] = self.enqueued
+            self.enqueued += 1
+            self.queue.append((key, scan_id, args))
+            self.cond.notify()
+            return scan_id, False
+
+    def position(self, scan_id):
+        """1-based place in the queue, or None once the scan has started (or is unknown)."""
+        with self.cond:
+            seq = self.seq.get(scan_id)
+            return None if seq is None else seq - self.started + 1
+
+    def stats(self):
+        with self.cond:
+            return {"workers": self.max_workers, "running": self.running, "queued": len(self.queue)}
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                key, scan_id, args = self.queue.popleft()
+                del self.seq[scan_id]
+                self.started += 1
+                self.running += 1
+            try:
+                self.run_fn(scan_id, *args)
+            except Exception as e:
+                print(f"Scan {scan_id} failed: {e}")
+            finally:
+                with self.cond:
+                    self.running -= 1
+                    if self.in_flight.get(key) == scan_id:
+                        del self.in_flight[key]
@@ -1,102 +1,283 @@
+import hashlib
 import json
 import os
 import time
 import threading
+import itertools
 import uuid
 import uuid
 import subprocess
-import json as py_json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import RLock as Lock
 from typing import Dict, Optional, List
 from providers.k8s_provider import K8sProvider
+from core.state_store import StateStore
+from core.job_manager import JobManager, CREATE_POD_STAGES, DEFERRED
+from core.reservations import ReservationLedger
+from core.placement import PlacementEngine, DEFAULT_STRATEGY
+from core.capacity import CapacityMatrix
+from core.log_streams import LogStreamHub
+from core.log_buffer import LogBufferRegistry, render as render_log_lines
+from core.persistence import RecordStore
+from core.scan_cache import ScanCache, TrivyDbVersion, download_trivy_db, parse_digest
+from core.scan_scheduler import ScanScheduler
+from core.scan_history import ScanHistory
+from core.trivy_stream import TrivyReportParser
 from datetime import datetime
 
 class ScanManager:
-    """Manages background Trivy scans and their logs."""
-    def __init__(self):
-        self.scans = {}
+    """Manages background Trivy scans and their logs.
+
+    Memory is bounded: each scan keeps only its last `max_log_lines` log
+    lines (counting the ones dropped), and finished scans are evicted once
+    they are older than `ttl` seconds or more than `max_scans` scans are
+    held. Queued and running scans are never evicted. With an `archive_dir`,
+    finished trivy runs are written there and loaded back on demand after
+    eviction (see RecordStore); answers from the report cache are not.
+    """
+    def __init__(self, max_scans=200, ttl=3600, max_log_lines=500, archive_dir=None,
+                 archive_ttl=7 * 24 * 3600):
+        self.records = RecordStore("scan", max_scans, ttl, archive_dir, archive_ttl)
+        self.scans = self.records.by_id
         self.lock = threading.Lock()
+        # Notified whenever a scan changes (new log line, progress, status)
+        self.updated = threading.Condition(self.lock)
+        self.max_log_lines = max_log_lines
+        # scan_id -> callbacks to run with the finished scan
+        self.callbacks = {}
 
-    def create_scan(self, image_url):
+    def create_scan(self, image_url, status="running"):
         scan_id = str(uuid.uuid4())
         with self.lock:
-            self.scans[scan_id] = {
+            self.records.add(scan_id, {
                 "id": scan_id,
                 "image": image_url,
-                "status": "running",
-                "logs": [],
+                "status": status,
+                "logs": deque(maxlen=self.max_log_lines),
+                "logs_dropped": 0,
+                # Bumped on every change, so watchers can wait for the next one
+                "updates": 0,
                 "result": None,
                 "start_time": datetime.now().isoformat()
-            }
+            })
         return scan_id
 
-    def add_log(self, scan_id, log_line):
+    def start_scan(self, scan_id):
+        """Moves a queued scan to running once a worker picks it up."""
         with self.lock:
             if scan_id in self.scans:
-                self.scans[scan_id]["logs"].append(log_line)
+                self.scans[scan_id]["status"] = "running"
+                self.scans[scan_id]["started_at"] = datetime.now().isoformat()
+                self._changed(self.scans[scan_id])
+
+    def add_log(self, scan_id, log_line):
+        with self.lock:
+            scan = self.scans.get(scan_id)
+            if scan:
+                if len(scan["logs"]) == scan["logs"].maxlen:
+                    scan["logs_dropped"] += 1
+                scan["logs"].append(log_line)
+                self._changed(scan)
 
-    def complete_scan(self, scan_id, result, status="success"):
+    def update_progress(self, scan_id, partial):
+        """Records the running severity counts while trivy output is still being parsed."""
         with self.lock:
             if scan_id in self.scans:
-                self.scans[scan_id]["status"] = status
-                self.scans[scan_id]["result"] = result
-                self.scans[scan_id]["end_time"] = datetime.now().isoformat()
+                self.scans[scan_id]["partial"] = partial
+                self._changed(self.scans[scan_id])
+
+    def complete_scan(self, scan_id, result, status="success", archive=True):
+        """Finishes a scan; archive=False keeps it in memory only (e.g. answered from the cache)."""
+        with self.lock:
+            scan = self.scans.get(scan_id)
+            if not scan:
+                return
+            scan["status"] = status
+            scan["result"] = result
+            scan["end_time"] = datetime.now().isoformat()
+            scan.pop("partial", None)
+            self._changed(scan)
+            snapshot = self._snapshot(scan)
+            callbacks = self.callbacks.pop(scan_id, [])
+            self.records.finish(scan_id)
+        if archive:
+            self.records.archive(snapshot)
+        for callback in callbacks:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Scan completion callback for {scan_id} failed: {e}")
+
+    def get_scan(self, scan_id, offset=None):
+        """Returns a copy of the scan, reading it back from the archive if it was evicted.
 
-    def get_scan(self, scan_id):
+        With an offset, "logs" only holds the lines from that index on
+        (indexes count from the first line the scan ever logged).
+        """
         with self.lock:
-            return self.scans.get(scan_id)
+            self.records.evict()
+            scan = self.scans.get(scan_id)
+            if scan:
+                return self._snapshot(scan, offset)
+        archived = self.records.load_archived(scan_id)
+        return self._snapshot(archived, offset) if archived else None
+
+    def on_complete(self, scan_id, callback):
+        """Calls callback(scan) once the scan has finished (right away if it already has)."""
+        with self.lock:
+            scan = self.scans.get(scan_id)
+            if scan and scan["status"] in ("queued", "running"):
+                self.callbacks.setdefault(scan_id, []).append(callback)
+                return
+            snapshot = self._snapshot(scan) if scan else None
+        callback(snapshot or self.records.load_archived(scan_id) or {"status": "error", "result": {"error": "Scan not found"}})
+
+    def wait_update(self, scan_id, updates, offset=None, timeout=15):
+        """Blocks until the scan changes past `updates` (or timeout) and returns it from offset."""
+        deadline = time.time() + timeout
+        with self.lock:
+            scan = self.scans.get(scan_id)
+            while scan and scan["updates"] == updates and scan["status"] in ("queued", "running"):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.updated.wait(remaining)
+                scan = self.scans.get(scan_id)
+            if scan:
+                return self._snapshot(scan, offset)
+        archived = self.records.load_archived(scan_id)
+        return self._snapshot(archived, offset) if archived else None
+
+    def _changed(self, scan):
+        scan["updates"] += 1
+        self.updated.notify_all()
+
+    @staticmethod
+    def _snapshot(scan, offset=None):
+        logs = scan.get("logs", [])
+        dropped = scan.get("logs_dropped", 0)
+        # Skip lines before the offset (and those already dropped from the ring buffer)
+        start = max(0, offset - dropped) if offset else 0
+        return {**scan, "logs": list(itertools.islice(logs, start, None)),
+                "log_offset": dropped + min(start, len(logs)), "next_offset": dropped + len(logs)}
 
 class ServerManager:
     """Manages the server state and persistence in master.json."""
     
-    def __init__(self, config_path):
+    def __init__(self, config_path, job_workers=4, use_informers=True, shared_store=False,
+                 bulk_workers_per_cluster=4, scan_workers=2, trivy_cache_dir=None):
         self.config_path = config_path
+        self.use_informers = use_informers
+        # Concurrent create/delete calls per cluster in bulk operations (below the provider pool size)
+        self.bulk_workers_per_cluster = bulk_workers_per_cluster
         self.lock = Lock()
         self.server_providers = {}
-        self.scan_manager = ScanManager()
-        self.reload_config()
+        data_dir = os.path.dirname(os.path.abspath(config_path))
+        # Finished scans are archived next to master.json once evicted from memory
+        self.scan_manager = ScanManager(archive_dir=os.path.join(data_dir, "scan_reports"))
+        # Parsed trivy reports by image digest + DB version
+        self.scan_cache = ScanCache(os.path.join(data_dir, "scan_cache"))
+        # One trivy cache dir (vulnerability DB + layer cache) shared by every scan
+        self.trivy_cache_dir = trivy_cache_dir or os.path.join(data_dir, "trivy_cache")
+        self.trivy_db = TrivyDbVersion(cache_dir=self.trivy_cache_dir)
+        # Completed scans and their findings, indexed by image, digest, CVE and package
+        self.scan_history = ScanHistory(os.path.join(data_dir, "scan_history.db"))
+        # At most scan_workers trivy processes at once; repeat scans of an image share one run
+        self.scan_scheduler = ScanScheduler(self._run_trivy_scan, max_workers=scan_workers)
+        # One shared upstream follow stream per pod, fanned out to all viewers
+        self.log_streams = LogStreamHub()
+        # Recent log lines per pod for cursor-based polling
+        self.log_buffers = LogBufferRegistry()
+        # Finished jobs (with their full results) are archived once evicted from memory
+        self.job_manager = JobManager(max_workers=job_workers, archive_dir=os.path.join(data_dir, "job_results"))
+        # Picks a server when /create is called without server_id
+        self.placement = PlacementEngine()
+        # Holds resources of pods that are admitted but still provisioning. Holds are
+        # per process: other workers only see a pod once it is recorded in the store
+        self.reservations = ReservationLedger(on_change=self.placement.set_held)
+        # Columnar copy of fleet resources for validation and capacity queries
+        self.capacity = CapacityMatrix()
+        # shared_store=True when several worker processes serve the same master.json
+        self.store = StateStore(config_path, shared=shared_store)
+        self._providers_load_count = None
+        self._init_providers()
+
+    @property
+    def config(self):
+        return self.store.config
 
     def reload_config(self):
-        """Loads config and initializes providers."""
+        """Picks up external edits to master.json and re-initializes providers if needed."""
         with self.lock:
-            if not os.path.exists(self.config_path):
-                self.config = {"servers": [], "config": {}}
-                return
-            with open(self.config_path, 'r') as f:
-                self.config = json.load(f)
+            changed = self.store.refresh_if_changed()
+            # Providers only need a rebuild when the store was fully reloaded
+            if self.store.load_count != self._providers_load_count:
+                self._init_providers()
+            elif changed:
+                self.placement.rebuild(s for s in self.store.servers() if s.get("id") in self.server_providers)
+                self.capacity.rebuild(self.store.servers())
+
+    @staticmethod
+    def _kubeconfig_fingerprint(kubeconfig):
+        """Stable hash of a server's kubeconfig_data, used as the provider cache key."""
+        canonical = json.dumps(kubeconfig, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _init_providers(self):
+        """Syncs providers with the configured servers.
 
-            # Initialize providers
-            self.server_providers = {}
-            for server in self.config.get("servers", []):
+        Providers are cached by kubeconfig fingerprint, so servers whose
+        kubeconfig is unchanged keep their client and warm connection pool.
+        Only added servers and servers with a changed kubeconfig get a new
+        provider; removed servers are dropped.
+        """
+        with self.lock:
+            self._providers_load_count = self.store.load_count
+            providers = {}
+            for server in self.store.servers():
                 server_id = server.get("id")
                 kubeconfig = server.get('connection_coordinates', {}).get('kubeconfig_data')
                 
                 # Only init provider if we have kubeconfig
-                if kubeconfig:
-                    try:
-                        self.server_providers[server_id] = {
-                            "provider": K8sProvider(kubeconfig),
-                            "last_updated": datetime.now()
-                        }
-                    except Exception as e:
-                        print(f"Failed to init provider for {server_id}: {e}")
+                if not kubeconfig:
+                    continue
 
-    def _save_config(self):
-        with self.lock:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=2)
+                fingerprint = self._kubeconfig_fingerprint(kubeconfig)
+                cached = self.server_providers.get(server_id)
+                if cached and cached.get("fingerprint") == fingerprint:
+                    providers[server_id] = cached
+                    continue
+
+                try:
+                    provider = K8sProvider(kubeconfig)
+                    if self.use_informers:
+                        provider.start_informer()
+                    providers[server_id] = {
+                        "provider": provider,
+                        "fingerprint": fingerprint,
+                        "last_updated": datetime.now()
+                    }
+                except Exception as e:
+                    print(f"Failed to init provider for {server_id}: {e}")
+
+            # Release connection pools of providers that were replaced or removed
+            kept = {id(w["provider"]) for w in providers.values()}
+            for wrapper in self.server_providers.values():
+                if id(wrapper["provider"]) not in kept:
+                    wrapper["provider"].close()
+            self.server_providers = providers
+            self.placement.rebuild(s for s in self.store.servers() if s.get("id") in providers)
+            self.capacity.rebuild(self.store.servers())
 
     def get_all_servers(self):
         """Returns all configured servers."""
         self.reload_config()
-        return self.config.get("servers", [])
+        return self.store.servers()
 
     def get_server_by_id(self, server_id):
         """Finds a server by its ID."""
-        for server in self.config.get("servers", []):
-            if server["id"] == server_id:
-                return server
-        return None
+        return self.store.get_server(server_id)
 
     def get_pods_for_server(self, server_id):
         """Returns list of pods for a specific server."""
@@ -106,12 +287,35 @@ class ServerManager:
 
     def update_server_status(self, server_id, status):
         """Updates the online/offline status of a server."""
-        for server in self.config.get("servers", []):
-            if server["id"] == server_id:
-                server["status"] = status
-                self._save_config()
-                return True
-        return False
+        with self.lock, self.store.transaction():
+            if not self.store.get_server(server_id):
+                return False
+            self.store.commit({"op": "server_updated", "server_id": server_id, "fields": {"status": status}}, durable=False)
+            self._sync_placement(server_id)
+        self.store.flush()
+        return True
+
+    def _sync_placement(self, server_id):
+        """Pushes a server's current resources into the placement index and capacity matrix."""
+        server = self.store.get_server(server_id)
+        self.placement.update_server(server_id, server if server_id in self.server_providers else None)
+        if server:
+            self.capacity.update_server(server)
+
+    def validate_resources(self) -> List[str]:
+        """Fleet-wide consistency check of master.json resources. Returns error strings."""
+        self.reload_config()
+        return self.capacity.validate()
+
+    def servers_that_fit(self, requested: Dict) -> List[str]:
+        """Ids of servers whose available resources can hold `requested`."""
+        self.reload_config()
+        return self.capacity.fit(requested)
+
+    def utilization_summary(self) -> Dict:
+        """Allocated/total ratios per server and for the fleet."""
+        self.reload_config()
+        return self.capacity.utilization()
 
     def validation_steps(self, pod_data: Dict) -> Dict:
         """Validates and prepares the pod object."""
@@ -130,6 +334,7 @@ class ServerManager:
         cpus = float(raw_resources.get('cpus', 0.1))
         ram_gb = float(raw_resources.get('ram_gb', 0.1))
         storage_gb = float(raw_resources.get('storage_gb', 0.1))
+        gpus = int(raw_resources.get('gpus', 0))
 
         # 3. Image
         image_url = pod_data.get('image_url') or pod_data.get('image') or 'nginx:latest'
@@ -150,48 +355,81 @@ class ServerManager:
             "status": "provisioning", # Initial status
             "timestamp": datetime.now().isoformat()
         }
+        if gpus:
+            pod_object["requested"]["gpus"] = gpus
         
         return pod_object
 
-    def create_pod(self, server_id: str, pod_data: Dict) -> Dict:
-        """Create a pod on the specified server."""
+    def _admit_pod(self, server_id: Optional[str], pod_data: Dict):
+        """Validates a create request and reserves its resources.
+
+        Without a server_id the placement engine picks the server, using
+        pod_data['strategy'] (default best_fit). Returns
+        (server_id, pod_object, provider, None) or (None, None, None, error).
+        """
         try:
             pod_object = self.validation_steps(pod_data)
         except ValueError as e:
-            return {'status': 'error', 'message': str(e)}
+            return None, None, None, {'status': 'error', 'message': str(e)}
+
+        # Admission reads "available": catch up with pods other workers recorded first
+        self.reload_config()
+        if server_id:
+            error = self._reserve_on(server_id, pod_object)
+        else:
+            server_id, error = self._place_pod(pod_object, pod_data.get('strategy') or DEFAULT_STRATEGY)
+        if error:
+            return None, None, None, error
+
+        return server_id, pod_object, self.server_providers[server_id]["provider"], None
 
+    def _reserve_on(self, server_id, pod_object):
+        """Reserves the pod's resources on a server. Returns None or an error dict."""
         # Check server existence in config first
         server = self.get_server_by_id(server_id)
         if not server:
             return {"error": f"Server {server_id} not found in config"}
 
-        # Resource Availability Check (Soft check before trying provider)
-        # Note: This checks local 'bookkeeping' availability, K8s might still reject if node full
-        available = server.get('resources', {}).get('available', {})
-        requested = pod_object['requested']
-        if (requested['cpus'] > available.get('cpus', 0) or 
-            requested['ram_gb'] > available.get('ram_gb', 0)):
-             return {"error": "Insufficient resources (bookkeeping check)"}
-
         if server_id not in self.server_providers:
             self.reload_config()
             if server_id not in self.server_providers:
                 return {"error": f"Server {server_id} provider not initialized (missing kubeconfig?)"}
 
+        # One record per (server, pod id): delete and lookups address pods by that key
+        if self.store.get_pod(server_id, pod_object['pod_id']):
+            return {"error": f"Pod {pod_object['pod_id']} already exists on server {server_id}"}
+
+        # Resource Availability Check (Soft check before trying provider)
+        # Note: This checks local 'bookkeeping' availability, K8s might still reject if node full.
+        # The reservation holds the resources until the pod is recorded, so concurrent
+        # requests are checked against what is left after pods still provisioning.
+        available = server.get('resources', {}).get('available', {})
+        error = self.reservations.reserve(server_id, pod_object['pod_id'], pod_object['requested'], available)
+        return {"error": error} if error else None
+
+    def _place_pod(self, pod_object, strategy, attempts=5):
+        """Picks a server for the pod and reserves on it. Returns (server_id, None) or (None, error)."""
+        self.reload_config()
+        tried = set()
+        for _ in range(attempts):
+            try:
+                candidate = self.placement.place(pod_object['requested'], strategy, exclude=tried)
+            except ValueError as e:
+                return None, {"error": str(e)}
+            if candidate is None:
+                break
+            # The index can lag a concurrent admission; the reservation is the real check
+            if self._reserve_on(candidate, pod_object) is None:
+                return candidate, None
+            tried.add(candidate)
+        return None, {"error": "Insufficient resources: no server can fit the requested pod"}
+
+    def _provision_pod(self, server_id, pod_object, provider, progress_callback=None):
+        """Creates the pod through the provider and records the outcome in master.json."""
         try:
-            provider_wrapper = self.server_providers[server_id]
-            provider = provider_wrapper["provider"]
-            
-            # Call provider
             # Note: pod_object matches the clean structure expected by K8sProvider.create_pod
-            result = provider.create_pod(pod_object)
-            
-            # Synchonous Pod Sync
-            if result.get('status') == 'success':
-                 try:
-                     time.sleep(2)
-                 except: pass # safe sleep
-                 
+            result = provider.create_pod(pod_object, progress_callback=progress_callback)
+
             # Always update master.json, even on timeout/error, so the user sees the pod state
             try:
                 self.update_pod_object(server_id, pod_object, creation_result=result)
@@ -199,40 +437,242 @@ class ServerManager:
                 print(f"Failed to update pod object: {e}")
 
             return result
+        finally:
+            # No-op if update_pod_object already committed the reservation
+            self.reservations.release(server_id, pod_object["pod_id"])
+
+    def create_pod(self, server_id: Optional[str], pod_data: Dict) -> Dict:
+        """Create a pod on the specified server, or on the one placement picks."""
+        placed = not server_id
+        server_id, pod_object, provider, error = self._admit_pod(server_id, pod_data)
+        if error:
+            return error
+
+        try:
+            result = self._provision_pod(server_id, pod_object, provider)
         except Exception as e:
             return {"error": f"Failed to create pod: {e}"}
+        if placed:
+            result["server_id"] = server_id
+        return result
 
-    def update_pod_object(self, server_id, pod_object, creation_result):
-        """Updates master.json with the new pod and deducts resources."""
-        with self.lock:
-            self.reload_config() # Refresh state (reload_config is safe with RLock)
-            for server in self.config.get("servers", []):
-                if server["id"] == server_id:
-                    # Enrich pod object with result details
-                    # If provider explicitly reports error (e.g. timeout), set status to error
-                    if creation_result.get('status') == 'error':
-                         pod_object['status'] = 'error'
+    def create_pod_async(self, server_id: Optional[str], pod_data: Dict) -> Dict:
+        """Validates the request and provisions the pod on the job executor."""
+        server_id, pod_object, provider, error = self._admit_pod(server_id, pod_data)
+        if error:
+            return error
+
+        try:
+            job_id = self.job_manager.submit(
+                "create_pod", self._run_create_job, server_id, pod_object, provider,
+                stages=CREATE_POD_STAGES, server_id=server_id, pod_id=pod_object["pod_id"]
+            )
+        except Exception as e:
+            self.reservations.release(server_id, pod_object["pod_id"])
+            return {"error": f"Failed to schedule pod creation: {e}"}
+        return {"status": "accepted", "job_id": job_id, "pod_id": pod_object["pod_id"], "server_id": server_id}
+
+    def _run_create_job(self, job_id, server_id, pod_object, provider):
+        """Job body for create_pod_async."""
+        def progress(stage, state, detail=None):
+            self.job_manager.set_stage(job_id, stage, state, detail)
+
+        return self._provision_pod(server_id, pod_object, provider, progress_callback=progress)
+
+    def get_job_status(self, job_id):
+        """Returns the current state of a background job."""
+        return self.job_manager.get_job(job_id)
+
+    def create_pods_bulk(self, items: List[Dict], defaults: Optional[Dict] = None) -> Dict:
+        """Creates many pods at once and returns a per-item summary.
+
+        Every item is validated and reserved up front, then the admitted pods
+        are provisioned in parallel (bounded per cluster). Each pod is recorded
+        in master.json as soon as its create returns, which turns its hold into
+        a deduction; one flush at the end makes them durable. Items without a
+        server_id are placed.
+        """
+        results, admitted = self._admit_bulk(items, defaults)
+        self._provision_bulk(admitted, results)
+        return self._bulk_summary(results)
+
+    def create_pods_bulk_async(self, items: List[Dict], defaults: Optional[Dict] = None) -> Dict:
+        """Admits the items now and provisions them on the job executor."""
+        results, admitted = self._admit_bulk(items, defaults)
+        if not admitted:
+            return self._bulk_summary(results)
+
+        try:
+            job_id = self.job_manager.submit(
+                "create_pods_bulk", self._run_bulk_create_job, admitted, results,
+                stages=[f"{server_id}/{pod_object['pod_id']}" for _, server_id, pod_object, _ in admitted],
+                total=len(items)
+            )
+        except Exception as e:
+            for _, server_id, pod_object, _ in admitted:
+                self.reservations.release(server_id, pod_object["pod_id"])
+            return {"error": f"Failed to schedule bulk creation: {e}"}
+        return {"status": "accepted", "job_id": job_id, **self._bulk_summary(results, status="accepted")}
+
+    def _run_bulk_create_job(self, job_id, admitted, results):
+        """Job body for create_pods_bulk_async; each pod is one stage of the job."""
+        def progress(item):
+            state = "done" if item["status"] == "success" else "failed"
+            self.job_manager.set_stage(job_id, f"{item['server_id']}/{item['pod_id']}", state, item.get("error"))
+
+        for _, server_id, pod_object, _ in admitted:
+            self.job_manager.set_stage(job_id, f"{server_id}/{pod_object['pod_id']}", "in_progress")
+        self._provision_bulk(admitted, results, progress_callback=progress)
+        return self._bulk_summary(results)
+
+    def _admit_bulk(self, items, defaults=None):
+        """Admits every item (reserving its resources). Returns (results, admitted)."""
+        defaults = defaults or {}
+        results = [None] * len(items)
+        admitted = []
+        for i, item in enumerate(items):
+            item = {**defaults, **item}
+            server_id, pod_object, provider, error = self._admit_pod(item.get("server_id"), item)
+            if error:
+                results[i] = {
+                    "index": i,
+                    "pod_id": item.get("pod_id") or item.get("pod_name"),
+                    "server_id": item.get("server_id"),
+                    "status": "rejected",
+                    "error": error.get("error") or error.get("message"),
+                }
+            else:
+                results[i] = {"index": i, "pod_id": pod_object["pod_id"], "server_id": server_id, "status": "pending"}
+                admitted.append((i, server_id, pod_object, provider))
+        return results, admitted
+
+    def _run_per_cluster(self, tasks):
+        """Runs (server_id, key, fn, args) tasks in parallel, bounded per cluster.
+
+        Yields (key, result, error) as tasks finish; error is the exception
+        raised by fn, or None.
+        """
+        executors = {}
+        try:
+            futures = {}
+            for server_id, key, fn, args in tasks:
+                if server_id not in executors:
+                    executors[server_id] = ThreadPoolExecutor(max_workers=self.bulk_workers_per_cluster,
+                                                              thread_name_prefix=f"bulk-{server_id}")
+                futures[executors[server_id].submit(fn, *args)] = key
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+
+    def _provision_bulk(self, admitted, results, progress_callback=None):
+        """Provisions admitted pods in parallel, one bounded pool per cluster.
+
+        A large batch can take far longer than the reservation TTL. The holds
+        of pods not yet created are refreshed while the batch runs, and pods
+        are recorded one by one as they are created instead of all at the
+        end, so concurrent creates never see capacity the batch has promised.
+        The commits are not durable on their own; the writer coalesces them
+        and one flush at the end waits for all of them.
+        """
+        tasks = [(server_id, (i, server_id, pod_object), provider.create_pod, (pod_object,))
+                 for i, server_id, pod_object, provider in admitted]
+        # Pods still waiting for a worker must not lose their holds either
+        done = threading.Event()
+        keys = [(server_id, pod_object["pod_id"]) for _, server_id, pod_object, _ in admitted]
+
+        def keep_holds():
+            while not done.wait(self.reservations.default_ttl / 3):
+                self.reservations.refresh(keys)
+
+        threading.Thread(target=keep_holds, name="bulk-hold-refresh", daemon=True).start()
+        try:
+            for (i, server_id, pod_object), result, error in self._run_per_cluster(tasks):
+                item = results[i]
+                if error:
+                    # Like create_pod: a provider exception leaves nothing to record
+                    item.update(status="error", error=f"Failed to create pod: {error}")
+                else:
+                    try:
+                        self._record_pods([(server_id, pod_object, result)], flush=False)
+                    except Exception as e:
+                        print(f"Failed to record bulk-created pod {pod_object['pod_id']}: {e}")
+                    if result.get("status") == "error" or "error" in result:
+                        item.update(status="error", error=result.get("error") or result.get("message"))
                     else:
-                         pod_object['status'] = 'running' if creation_result.get('pod_ip') else 'error'
-                    
-                    pod_object['pod_ip'] = creation_result.get('pod_ip')
-                    pod_object['external_ip'] = creation_result.get('external_ip')
-                    # Store error message if present for debugging? (Schema might not have it, but useful to have)
-                     # pod_object['error_message'] = creation_result.get('message') # Optional enhancement
-                    
-                    server["pods"].append(pod_object)
-                    
-                    # Deduct resources
-                    req = pod_object["requested"]
-                    avail = server["resources"]["available"]
-                    alloc = server["resources"]["allocated"]
-                    
-                    for k in ["cpus", "ram_gb", "storage_gb"]:
-                        val = req.get(k, 0)
-                        if k in avail: avail[k] = max(0, avail[k] - val)
-                        if k in alloc: alloc[k] += val
-            
-            self._save_config()
+                        item.update(status="success", pod_ip=result.get("pod_ip"),
+                                    external_ip=result.get("external_ip"))
+                if progress_callback:
+                    progress_callback(item)
+        finally:
+            done.set()
+            try:
+                self.store.flush()
+            except Exception as e:
+                print(f"Failed to flush bulk-created pods: {e}")
+            # No-op for pods _record_pods already committed
+            for _, server_id, pod_object, _ in admitted:
+                self.reservations.release(server_id, pod_object["pod_id"])
+
+    @staticmethod
+    def _bulk_summary(results, status="completed"):
+        counts = {"success": 0, "error": 0, "rejected": 0, "pending": 0}
+        for item in results:
+            counts[item["status"]] += 1
+        return {
+            "status": status,
+            "total": len(results),
+            "succeeded": counts["success"],
+            "failed": counts["error"],
+            "rejected": counts["rejected"],
+            "items": results,
+        }
+
+    def update_pod_object(self, server_id, pod_object, creation_result):
+        """Records the new pod in master.json and deducts its resources."""
+        self._record_pods([(server_id, pod_object, creation_result)])
+
+    def _record_pods(self, created, flush=True):
+        """Records (server_id, pod_object, creation_result) tuples in a single commit.
+
+        With flush=False the caller is responsible for calling store.flush().
+        """
+        with self.lock, self.store.transaction():
+            self.reload_config() # Pick up external edits (no-op if master.json is unchanged)
+            entries = []
+            for server_id, pod_object, creation_result in created:
+                if not self.store.get_server(server_id):
+                    continue
+                # Enrich pod object with result details
+                # If provider explicitly reports error (e.g. timeout), set status to error
+                if creation_result.get('status') == 'error':
+                     pod_object['status'] = 'error'
+                else:
+                     pod_object['status'] = 'running' if creation_result.get('pod_ip') else 'error'
+
+                pod_object['pod_ip'] = creation_result.get('pod_ip')
+                pod_object['external_ip'] = creation_result.get('external_ip')
+                # Store error message if present for debugging? (Schema might not have it, but useful to have)
+                 # pod_object['error_message'] = creation_result.get('message') # Optional enhancement
+                entries.append({"op": "pod_added", "server_id": server_id, "pod": pod_object})
+            if not entries:
+                return
+
+            # Appending a pod also deducts its requested resources
+            self.store.commit(entries[0] if len(entries) == 1 else {"op": "batch", "entries": entries}, durable=False)
+            for entry in entries:
+                self.capacity.add_pod(entry["server_id"], entry["pod"])
+            for server_id in {entry["server_id"] for entry in entries}:
+                self._sync_placement(server_id)
+            # The deduction now covers the pods, so drop their holds
+            for entry in entries:
+                self.reservations.commit(entry["server_id"], entry["pod"]["pod_id"])
+        if flush:
+            self.store.flush()
 
     def update_pod(self, server_id: str, pod_id: str, image_url: str) -> Dict:
         """Updates a pod's image using rolling update strategy."""
@@ -242,12 +682,7 @@ class ServerManager:
             return {"error": "Server not found"}
 
         # Find pod
-        target_pod = None
-        for pod in server.get('pods', []):
-            if pod['pod_id'] == pod_id:
-                target_pod = pod
-                break
-        
+        target_pod = self.store.get_pod(server_id, pod_id)
         if not target_pod:
             return {"error": "Pod not found on server"}
             
@@ -264,19 +699,19 @@ class ServerManager:
             
             if result.get("status") == "success":
                 # Update master.json persistence
-                with self.lock:
+                with self.lock, self.store.transaction():
                     self.reload_config() # Refresh
-                    # Need to refetch reference in case config changed
-                    for s in self.config.get("servers", []):
-                        if s["id"] == server_id:
-                            for p in s["pods"]:
-                                if p["pod_id"] == pod_id:
-                                    p["image_url"] = image_url
-                                    p["timestamp"] = datetime.now().isoformat()
-                                    p["status"] = "running" # Ensure running
-                                    p["last_updated"] = datetime.now().isoformat()
-                                    break
-                    self._save_config()
+                    now = datetime.now().isoformat()
+                    self.store.commit({
+                        "op": "pod_updated", "server_id": server_id, "pod_id": pod_id,
+                        "fields": {
+                            "image_url": image_url,
+                            "timestamp": now,
+                            "status": "running", # Ensure running
+                            "last_updated": now
+                        }
+                    }, durable=False)
+                self.store.flush()
                     
             return result
         except Exception as e:
@@ -290,17 +725,12 @@ class ServerManager:
             return {"error": "Server not found"}
 
         # Find pod namespace
-        namespace = pod_id
-        pod_found = False
-        for pod in server.get('pods', []):
-            if pod['pod_id'] == pod_id:
-                namespace = pod.get('namespace', 'default')
-                pod_found = True
-                break
-        
-        if not pod_found:
+        pod = self.store.get_pod(server_id, pod_id)
+        if not pod:
             return {"error": "Pod not found in master.json"}
 
+        namespace = pod.get('namespace', 'default')
+
         if server_id not in self.server_providers:
             self.reload_config()
             
@@ -322,34 +752,108 @@ class ServerManager:
              # For now, return error
             return {"error": str(e)}
 
+    def delete_pods_bulk(self, items: List[Dict], propagation_policy="Background", track_namespaces=True) -> Dict:
+        """Deletes many pods at once and returns a per-item summary.
+
+        Deletions are issued concurrently (bounded per cluster) with the given
+        propagation policy, and every deleted pod is removed from master.json,
+        with its resources released, in a single commit. Namespace termination
+        is followed in the background by a job whose id is returned.
+        """
+        self.reload_config()
+        results = []
+        tasks = []
+        for i, item in enumerate(items):
+            server_id, pod_id = item.get("server_id"), item.get("pod_id")
+            entry = {"index": i, "server_id": server_id, "pod_id": pod_id}
+            results.append(entry)
+            pod = self.store.get_pod(server_id, pod_id) if server_id and pod_id else None
+            if not pod:
+                entry.update(status="not_found", error="Pod not found in master.json")
+                continue
+            entry["namespace"] = pod.get('namespace', 'default')
+            if server_id not in self.server_providers:
+                self.reload_config()
+            wrapper = self.server_providers.get(server_id)
+            if not wrapper:
+                # Same as delete_pod: nothing to delete in K8s, only clean the DB
+                print(f"Warning: No provider for {server_id}, skipping K8s deletion, only cleaning DB.")
+                entry["status"] = "deleted"
+                continue
+            tasks.append((server_id, i, wrapper["provider"].delete_pod,
+                          (entry["namespace"], pod_id, propagation_policy)))
+
+        for i, found, error in self._run_per_cluster(tasks):
+            if error:
+                results[i].update(status="error", error=str(error))
+            else:
+                # found=False means K8s had nothing left to delete
+                results[i]["status"] = "deleted"
+
+        deleted = [entry for entry in results if entry["status"] == "deleted"]
+        self._remove_pods_internal([(entry["server_id"], entry["pod_id"]) for entry in deleted])
+
+        summary = {
+            "status": "completed",
+            "total": len(results),
+            "deleted": len(deleted),
+            "failed": sum(1 for entry in results if entry["status"] == "error"),
+            "not_found": sum(1 for entry in results if entry["status"] == "not_found"),
+            "items": results,
+        }
+        namespaces = sorted({(entry["server_id"], entry["namespace"]) for entry in deleted
+                             if entry["server_id"] in self.server_providers and entry["namespace"] != "default"})
+        if track_namespaces and namespaces:
+            # Waits for minutes, so keep it off the pool that provisions pods
+            summary["namespace_job_id"] = self.job_manager.submit(
+                "namespace_gc", self._run_namespace_gc_job, namespaces,
+                stages=[f"{server_id}/{namespace}" for server_id, namespace in namespaces],
+                pool="maintenance"
+            )
+        return summary
+
+    def _run_namespace_gc_job(self, job_id, namespaces, timeout=300):
+        """Job body that follows namespaces until Kubernetes has finished terminating them."""
+        tasks = []
+        for server_id, namespace in namespaces:
+            stage = f"{server_id}/{namespace}"
+            self.job_manager.set_stage(job_id, stage, "in_progress")
+            provider = self.server_providers[server_id]["provider"]
+            tasks.append((server_id, stage, provider.wait_namespace_deleted, (namespace, timeout)))
+
+        stuck = []
+        for stage, gone, error in self._run_per_cluster(tasks):
+            if gone:
+                self.job_manager.set_stage(job_id, stage, "done")
+            else:
+                stuck.append(stage)
+                self.job_manager.set_stage(job_id, stage, "failed",
+                                           str(error) if error else f"still terminating after {timeout}s")
+        if stuck:
+            return {"error": f"{len(stuck)} namespace(s) did not finish terminating", "namespaces": stuck}
+        return {"status": "success", "namespaces": len(namespaces)}
+
     def _remove_pod_from_server_internal(self, server_id, pod_id):
         """Internal method to remove a pod and restore resources."""
-        with self.lock:
-            # Reload config
-            self.reload_config() # Uses the reloaded config from 'update_pod_object' logic effectively
-            for server in self.config.get("servers", []):
-                if server["id"] == server_id:
-                    pod_to_remove = None
-                    for pod in server["pods"]:
-                        if pod["pod_id"] == pod_id:
-                            pod_to_remove = pod
-                            break
-                    
-                    if pod_to_remove:
-                        server["pods"].remove(pod_to_remove)
-                        # Restore resources
-                        requested = pod_to_remove.get("requested", {})
-                        avail = server["resources"]["available"]
-                        alloc = server["resources"]["allocated"]
-                        
-                        for k in ["cpus", "ram_gb", "storage_gb"]:
-                            val = requested.get(k, 0)
-                            if k in avail: avail[k] += val
-                            if k in alloc: alloc[k] = max(0, alloc[k] - val)
-
-                        self._save_config()
-                        return True
-            return False
+        return self._remove_pods_internal([(server_id, pod_id)]) > 0
+
+    def _remove_pods_internal(self, keys):
+        """Removes (server_id, pod_id) pods and restores their resources in one commit. Returns the count."""
+        with self.lock, self.store.transaction():
+            self.reload_config() # Pick up external edits (no-op if master.json is unchanged)
+            entries = [{"op": "pod_removed", "server_id": server_id, "pod_id": pod_id}
+                       for server_id, pod_id in dict.fromkeys(keys) if self.store.get_pod(server_id, pod_id)]
+            if not entries:
+                return 0
+            # Removing a pod also restores its requested resources
+            self.store.commit(entries[0] if len(entries) == 1 else {"op": "batch", "entries": entries}, durable=False)
+            for entry in entries:
+                self.capacity.remove_pod(entry["server_id"], entry["pod_id"])
+                self.log_buffers.drop((entry["server_id"], entry["pod_id"]))
+            for server_id in {entry["server_id"] for entry in entries}:
+                self._sync_placement(server_id)
+        self.store.flush()
+        return len(entries)
 
     def get_pod_logs(self, server_id, pod_id):
         """Fetches logs for a pod on a specific server."""
@@ -360,11 +864,8 @@ class ServerManager:
 
         # Find pod to get namespace
         # Default to pod_id if not found, but we check master.json first
-        namespace = pod_id
-        for pod in server.get('pods', []):
-            if pod['pod_id'] == pod_id:
-                namespace = pod.get('namespace', pod_id)
-                break
+        pod = self.store.get_pod(server_id, pod_id)
+        namespace = pod.get('namespace', pod_id) if pod else pod_id
 
         if server_id not in self.server_providers:
             return "Provider not initialized for this server"
@@ -372,6 +873,55 @@ class ServerManager:
         provider = self.server_providers[server_id]["provider"]
         return provider.get_logs(namespace, pod_id)
 
+    def get_pod_logs_since(self, server_id, pod_id, cursor=None):
+        """Returns only the log lines newer than `cursor` (a timestamp from a previous call).
+
+        Lines come from a per-pod ring buffer that is topped up with
+        since_seconds reads. Returns {"lines", "cursor", "truncated"} or {"error"}.
+        """
+        self.reload_config()
+        if not self.get_server_by_id(server_id):
+            return {"error": "Server not found"}
+
+        pod = self.store.get_pod(server_id, pod_id)
+        namespace = pod.get('namespace', pod_id) if pod else pod_id
+
+        if server_id not in self.server_providers:
+            return {"error": "Provider not initialized for this server"}
+
+        provider = self.server_providers[server_id]["provider"]
+        buffer = self.log_buffers.get((server_id, pod_id))
+        try:
+            buffer.refresh(provider, namespace, pod_id)
+        except Exception as e:
+            return {"error": f"Error fetching logs: {e}"}
+        entries, cursor, truncated = buffer.since(cursor)
+        # Tag lines with their pod once more than one replica has written any
+        return {"lines": render_log_lines(entries, tagged=len(buffer.last_keys) > 1),
+                "cursor": cursor, "truncated": truncated}
+
+    def subscribe_pod_logs(self, server_id, pod_id):
+        """Joins the shared follow stream of a pod's logs.
+
+        Returns (stream, queue, None) or (None, None, error). Lines arrive on
+        the queue, ending with log_streams.END_OF_STREAM; call
+        log_streams.unsubscribe(stream, queue) when the viewer leaves.
+        """
+        self.reload_config()
+        if not self.get_server_by_id(server_id):
+            return None, None, {"error": "Server not found"}
+
+        pod = self.store.get_pod(server_id, pod_id)
+        namespace = pod.get('namespace', pod_id) if pod else pod_id
+
+        if server_id not in self.server_providers:
+            return None, None, {"error": "Provider not initialized for this server"}
+
+        provider = self.server_providers[server_id]["provider"]
+        stream, q = self.log_streams.subscribe(
+            (server_id, pod_id), lambda: provider.open_log_stream(namespace, pod_id))
+        return stream, q, None
+
     def scan_pod_image(self, server_id, pod_id):
         """Initiates a background security scan on a pod's image."""
         self.reload_config()
@@ -379,27 +929,179 @@ class ServerManager:
         if not server:
             return {"status": "error", "message": "Server not found"}
 
-        image_url = None
-        for pod in server.get('pods', []):
-            if pod['pod_id'] == pod_id:
-                image_url = pod.get('image_url')
-                break
+        pod = self.store.get_pod(server_id, pod_id)
+        image_url = pod.get('image_url') if pod else None
 
         if not image_url:
             return {"status": "error", "message": "Pod or Image URL not found"}
 
-        scan_id = self.scan_manager.create_scan(image_url)
-        
-        # Start background thread
-        thread = threading.Thread(target=self._run_trivy_scan, args=(scan_id, image_url))
-        thread.daemon = True
-        thread.start()
+        # Reports are cached per image digest, so resolve the tag to what is actually running
+        digest = parse_digest(image_url) or self._running_image_digest(server_id, pod)
+        return self._start_scan(image_url, digest, self.trivy_db.get())
+
+    def _start_scan(self, image_url, digest, db_version, skip_db_update=False):
+        """Answers from the report cache or queues a trivy run (joining one already in flight)."""
+        cached = self.scan_cache.get(digest, db_version)
+        if cached:
+            scan_id = self.scan_manager.create_scan(image_url)
+            self.scan_manager.add_log(scan_id, f"Using cached report for {digest} (trivy DB {db_version})")
+            # No trivy run: the report stays in the scan cache, so it is not archived again
+            self.scan_manager.complete_scan(scan_id, {**cached, "image": image_url, "cached": True}, archive=False)
+            return {"status": "accepted", "scan_id": scan_id, "cached": True}
+
+        scan_id, attached = self.scan_scheduler.submit(
+            digest or image_url, lambda: self.scan_manager.create_scan(image_url, status="queued"),
+            image_url, digest, db_version, skip_db_update)
+        result = {"status": "accepted", "scan_id": scan_id}
+        if attached:
+            result["attached"] = True
+        position = self.scan_scheduler.position(scan_id)
+        if position is not None:
+            result["queue_position"] = position
+        return result
+
+    def fleet_images(self) -> Dict[str, List[Dict]]:
+        """Unique image_urls across all servers, each with the pods running it."""
+        self.reload_config()
+        images = {}
+        for server in self.store.servers():
+            for pod in server.get("pods", []):
+                if pod.get("image_url"):
+                    images.setdefault(pod["image_url"], []).append({"server_id": server.get("id"), "pod": pod})
+        return images
+
+    def scan_fleet(self):
+        """Scans every unique image in master.json as one background job."""
+        images = self.fleet_images()
+        if not images:
+            return {"status": "error", "message": "No pod images found in master.json"}
+        try:
+            job_id = self.job_manager.submit("fleet_scan", self._run_fleet_scan_job, images,
+                                             stages=list(images), images=len(images), pool="maintenance")
+        except Exception as e:
+            return {"error": f"Failed to schedule fleet scan: {e}"}
+        return {"status": "accepted", "job_id": job_id, "images": len(images)}
+
+    def _run_fleet_scan_job(self, job_id, images, wait_timeout=3600):
+        """Job body for scan_fleet: one DB refresh, then every image through the scan pool.
+
+        The DB is downloaded once into the shared cache dir so the scans can
+        run with --skip-db-update instead of each checking it separately.
+        The job does not wait for the scans: each scan's completion callback
+        records its image, and the last one (or the timeout) completes the job.
+        """
+        error = download_trivy_db(self.trivy_cache_dir)
+        if error:
+            print(f"Could not refresh trivy DB before fleet scan, scans will update it themselves: {error}")
+        self.trivy_db.invalidate()
+        db_version = self.trivy_db.get()
+
+        started = {}
+        for image_url, pods in images.items():
+            first = pods[0]
+            digest = parse_digest(image_url) or self._running_image_digest(first["server_id"], first["pod"])
+            started[image_url] = self._start_scan(image_url, digest, db_version, skip_db_update=not error)["scan_id"]
+            self.job_manager.set_stage(job_id, image_url, "in_progress")
+
+        lock = threading.Lock()
+        by_image = {}
+        state = {"done": False}
+
+        def finish():
+            # Runs once: after the last scan, or at the timeout with whatever is still missing
+            with lock:
+                if state["done"]:
+                    return
+                state["done"] = True
+                for image_url in images:
+                    if image_url not in by_image:
+                        record(image_url, {"status": "error",
+                                           "result": {"error": f"Scan did not finish within {wait_timeout}s"}})
+                entries = [by_image[image_url] for image_url in images]
+            timer.cancel()
+            report = self._fleet_scan_report(entries, db_version)
+            # Some failures still make a usable report; none scanned at all (e.g. no trivy) does not
+            self.job_manager.complete_job(job_id, report, status="error" if report["scanned"] == 0 else "success")
+
+        def record(image_url, scan):
+            result = scan.get("result") or {}
+            status = scan.get("status", "error")
+            self.job_manager.set_stage(job_id, image_url, "done" if status == "success" else "failed",
+                                       result.get("error"))
+            by_image[image_url] = {
+                "image": image_url,
+                "scan_id": started[image_url],
+                "status": status,
+                "cached": bool(result.get("cached")),
+                "pods": [{"server_id": p["server_id"], "pod_id": p["pod"].get("pod_id")} for p in images[image_url]],
+                "summary": result.get("summary"),
+                "total": result.get("total"),
+                "vulnerabilities": result.get("vulnerabilities", []),
+                "error": result.get("error")
+            }
+
+        def on_scan_done(image_url, scan):
+            with lock:
+                if state["done"] or image_url in by_image:
+                    return
+                record(image_url, scan)
+                last = len(by_image) == len(images)
+            if last:
+                finish()
 
-        return {"status": "accepted", "scan_id": scan_id}
+        timer = threading.Timer(wait_timeout, finish)
+        timer.daemon = True
+        timer.start()
+        for image_url, scan_id in started.items():
+            self.scan_manager.on_complete(scan_id, lambda scan, image_url=image_url: on_scan_done(image_url, scan))
+        return DEFERRED
 
-    def _run_trivy_scan(self, scan_id, image_url):
+    @staticmethod
+    def _fleet_scan_report(by_image, db_version, top_cves=50):
+        """Consolidates per-image results: fleet severity totals and the most widespread CVEs."""
+        summary = {"Critical": 0, "High": 0, "Medium": 0, "Low": 0, "Unknown": 0}
+        cves = {}
+        for entry in by_image:
+            for severity, count in (entry["summary"] or {}).items():
+                summary[severity] = summary.get(severity, 0) + count
+            for vuln in entry.pop("vulnerabilities"):
+                cve = cves.setdefault(vuln["id"], {"id": vuln["id"], "severity": vuln["severity"],
+                                                   "title": vuln.get("title"), "images": set(), "pods": 0})
+                if entry["image"] not in cve["images"]:
+                    cve["images"].add(entry["image"])
+                    cve["pods"] += len(entry["pods"])
+        severity_rank = {s: i for i, s in enumerate(summary)}
+        widespread = sorted(cves.values(), key=lambda c: (severity_rank.get(c["severity"], len(summary)),
+                                                         -len(c["images"]), c["id"] or ""))[:top_cves]
+        by_image.sort(key=lambda e: (e["status"] != "success", -((e["summary"] or {}).get("Critical", 0)),
+                                     -(e["total"] or 0)))
+        return {
+            "db_version": db_version,
+            "images": len(by_image),
+            "scanned": sum(1 for e in by_image if e["status"] == "success"),
+            "cached": sum(1 for e in by_image if e["cached"]),
+            "failed": sum(1 for e in by_image if e["status"] != "success"),
+            "summary": summary,
+            "top_cves": [{**c, "images": sorted(c["images"])} for c in widespread],
+            "by_image": by_image
+        }
+
+    def _running_image_digest(self, server_id, pod):
+        """Digest of the image a pod is running, from its containerStatuses (None if unknown)."""
+        wrapper = self.server_providers.get(server_id)
+        if not wrapper or not pod:
+            return None
+        try:
+            image_id = wrapper["provider"].running_image_id(pod.get('namespace', pod['pod_id']), pod['pod_id'])
+        except Exception as e:
+            print(f"Could not resolve image digest for {pod.get('pod_id')}: {e}")
+            return None
+        return parse_digest(image_id)
+
+    def _run_trivy_scan(self, scan_id, image_url, digest=None, db_version=None, skip_db_update=False):
         """Background worker to run Trivy and capture logs."""
         
+        self.scan_manager.start_scan(scan_id)
         try:
             self.scan_manager.add_log(scan_id, f"Scanning {image_url} (this context may take a minute)...")
             
@@ -409,8 +1111,12 @@ class ServerManager:
                 "--format", "json", 
                 "--no-progress", 
                 "--skip-version-check",
-                image_url
+                "--cache-dir", self.trivy_cache_dir,
             ]
+            if skip_db_update:
+                # The DB in the shared cache dir was refreshed just before (fleet scans)
+                cmd.append("--skip-db-update")
+            cmd.append(image_url)
             
             process = subprocess.Popen(
                 cmd, 
@@ -435,8 +1141,22 @@ class ServerManager:
             stderr_thread = threading.Thread(target=stream_stderr)
             stderr_thread.start()
             
-            # Read stdout
-            stdout_content = process.stdout.read()
+            # Parse stdout as it arrives instead of buffering the whole report
+            parser = TrivyReportParser(collect_findings=True)
+            parse_error = None
+            while True:
+                chunk = process.stdout.read(65536)
+                if not chunk:
+                    break
+                if parse_error:
+                    continue
+                try:
+                    parser.feed(chunk)
+                except ValueError as e:
+                    # Keep draining stdout so trivy does not block on a full pipe
+                    parse_error = e
+                    continue
+                self.scan_manager.update_progress(scan_id, parser.partial())
             process.wait()
             stderr_thread.join()
 
@@ -446,62 +1166,75 @@ class ServerManager:
                 self.scan_manager.complete_scan(scan_id, {"error": f"Trivy exited with code {process.returncode}. Details: {error_details}"}, status="error")
                 return
 
-            if not stdout_content.strip():
+            if not parser.started and not parse_error:
                 self.scan_manager.complete_scan(scan_id, {"error": "Trivy returned empty output"}, status="error")
                 return
 
             try:
-                # Some versions of trivy might output notices to stdout even with --format json
-                # We try to find the start of the JSON object/array
-                start_idx = stdout_content.find('{')
-                if start_idx == -1:
-                    start_idx = stdout_content.find('[')
-                
-                if start_idx != -1:
-                    json_str = stdout_content[start_idx:]
-                    scan_data = py_json.loads(json_str)
-                else:
-                    scan_data = py_json.loads(stdout_content)
+                if parse_error:
+                    raise parse_error
+                parser.close()
             except Exception as e:
                 self.scan_manager.complete_scan(scan_id, {"error": f"Failed to parse Trivy output: {str(e)}"}, status="error")
                 return
-            
-            # Aggregate vulnerabilities
-            summary = {"Critical": 0, "High": 0, "Medium": 0, "Low": 0, "Unknown": 0}
-            vulnerabilities = []
-            
-            for res in scan_data.get("Results", []):
-                for vuln in res.get("Vulnerabilities", []):
-                    # Trivy severities are usually UPPERCASE (e.g., 'LOW', 'MEDIUM')
-                    # We normalize to Title case to match our summary keys
-                    raw_severity = vuln.get("Severity", "Unknown")
-                    severity = raw_severity.title() 
-                    
-                    if severity in summary:
-                        summary[severity] += 1
-                    else:
-                        summary["Unknown"] += 1
-                    
-                    if len(vulnerabilities) < 1000:
-                        vulnerabilities.append({
-                            "id": vuln.get("VulnerabilityID"),
-                            "pkg": vuln.get("PkgName"),
-                            "severity": severity, # Use normalized severity for consistency
-                            "title": vuln.get("Title", "No title")
-                        })
-            
+
             report = {
                 "image": image_url,
-                "summary": summary,
-                "vulnerabilities": vulnerabilities,
-                "total": sum(summary.values())
+                "summary": parser.summary,
+                "vulnerabilities": parser.vulnerabilities(),
+                "total": parser.total
             }
+
+            # Fall back to the digest trivy resolved when the pod status did not have one
+            digest = digest or next(filter(None, map(parse_digest, parser.repo_digests)), None)
+            self.scan_cache.put(digest, db_version, image_url, report)
+            try:
+                self.scan_history.record(scan_id, image_url, digest, db_version, report, parser.findings)
+            except Exception as e:
+                print(f"Failed to record scan {scan_id} in history: {e}")
             
             self.scan_manager.complete_scan(scan_id, report)
             
         except Exception as e:
             self.scan_manager.complete_scan(scan_id, {"error": str(e)}, status="error")
 
-    def get_scan_status(self, scan_id):
-        """Returns the current state of a scan."""
-        return self.scan_manager.get_scan(scan_id)
+    def get_scan_history(self, image_url, limit=20):
+        """Past scans of an image, newest first."""
+        return self.scan_history.scans_for_image(image_url, limit)
+
+    def affected_pods(self, cve=None, pkg=None):
+        """Pods across all servers whose image's latest scan has the CVE and/or package."""
+        images = self.scan_history.affected_images(cve, pkg)
+        self.reload_config()
+        pods = []
+        for server in self.store.servers():
+            for pod in server.get("pods", []):
+                if pod.get("image_url") in images:
+                    pods.append({
+                        "server_id": server.get("id"),
+                        "server_name": server.get("name"),
+                        "pod_id": pod.get("pod_id"),
+                        "namespace": pod.get("namespace"),
+                        "status": pod.get("status"),
+                        "image_url": pod.get("image_url")
+                    })
+        # Findings are listed once per image; pods refer to them by image_url
+        return {"cve": cve, "pkg": pkg, "images": images, "pods": pods}
+
+    def get_scan_status(self, scan_id, offset=None):
+        """Returns the current state of a scan (with its queue position while queued).
+
+        With an offset only the log lines from that index on are returned.
+        """
+        return self._with_queue_position(self.scan_manager.get_scan(scan_id, offset))
+
+    def wait_scan_update(self, scan_id, updates, offset=None, timeout=15):
+        """Waits for the next change of a scan (see ScanManager.wait_update)."""
+        return self._with_queue_position(self.scan_manager.wait_update(scan_id, updates, offset, timeout))
+
+    def _with_queue_position(self, scan):
+        if scan and scan["status"] == "queued":
+            position = self.scan_scheduler.position(scan["id"])
+            if position is not None:
+                scan = {**scan, "queue_position": position}
+        return scan
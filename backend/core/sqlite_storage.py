@@ -0,0 +1,210 @@
+import argparse
+import json
+import sqlite3
+import threading
+
+from core.storage import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS servers (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    environment TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    server_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (server_id, bucket, resource)
+);
+CREATE TABLE IF NOT EXISTS pods (
+    server_id TEXT NOT NULL,
+    pod_id TEXT NOT NULL,
+    namespace TEXT,
+    status TEXT,
+    image_url TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (server_id, pod_id)
+);
+CREATE INDEX IF NOT EXISTS idx_servers_status ON servers(status);
+CREATE INDEX IF NOT EXISTS idx_pods_pod_id ON pods(pod_id);
+CREATE INDEX IF NOT EXISTS idx_pods_namespace ON pods(namespace);
+CREATE INDEX IF NOT EXISTS idx_pods_status ON pods(status);
+"""
+
+# Resource buckets kept in the resources ledger table
+RESOURCE_BUCKETS = ("total", "allocated", "available")
+
+
+class SqliteStorage(StorageBackend):
+    """SQLite (WAL mode) storage for the master config.
+
+    Servers, pods and the per-server resource ledger live in their own
+    indexed tables; every committed mutation is a single small transaction
+    instead of a rewrite of the whole document. A generation counter in the
+    meta table is bumped on each write so other processes can detect changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+
+    def _transaction(self, fn, *args):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(*args)
+                self.conn.execute(
+                    "INSERT INTO meta(key, value) VALUES('generation', '1') "
+                    "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def load(self):
+        with self.lock:
+            config = {"servers": [], "config": {}}
+            for key, value in self.conn.execute("SELECT key, value FROM meta WHERE key != 'generation'"):
+                config[key] = json.loads(value)
+
+            servers = {}
+            for server_id, data in self.conn.execute("SELECT id, data FROM servers ORDER BY rowid"):
+                server = json.loads(data)
+                server["resources"] = {bucket: {} for bucket in RESOURCE_BUCKETS}
+                server["pods"] = []
+                servers[server_id] = server
+                config["servers"].append(server)
+
+            for server_id, bucket, resource, amount in self.conn.execute(
+                    "SELECT server_id, bucket, resource, amount FROM resources"):
+                if server_id in servers:
+                    # Keep integral amounts as ints, as they are written in master.json
+                    servers[server_id]["resources"].setdefault(bucket, {})[resource] = (
+                        int(amount) if float(amount).is_integer() else amount)
+
+            for server_id, data in self.conn.execute("SELECT server_id, data FROM pods ORDER BY rowid"):
+                if server_id in servers:
+                    servers[server_id]["pods"].append(json.loads(data))
+            return config, []
+
+    def commit(self, entry, store):
+        self._transaction(self._write_entry, entry, store)
+
+    def _write_entry(self, entry, store):
+        op = entry["op"]
+        if op == "batch":
+            for sub_entry in entry["entries"]:
+                self._write_entry(sub_entry, store)
+            return
+        server_id = entry["server_id"]
+        server = store.get_server(server_id)
+        if op == "pod_added":
+            self._upsert_pod(server_id, entry["pod"])
+            self._write_resources(server_id, server)
+        elif op == "pod_removed":
+            self.conn.execute("DELETE FROM pods WHERE server_id = ? AND pod_id = ?", (server_id, entry["pod_id"]))
+            self._write_resources(server_id, server)
+        elif op == "pod_updated":
+            pod = store.get_pod(server_id, entry["pod_id"])
+            if pod:
+                self.conn.execute(
+                    "UPDATE pods SET namespace = ?, status = ?, image_url = ?, data = ? "
+                    "WHERE server_id = ? AND pod_id = ?",
+                    (pod.get("namespace"), pod.get("status"), pod.get("image_url"), json.dumps(pod),
+                     server_id, entry["pod_id"])
+                )
+        elif op == "server_updated":
+            self._upsert_server(server)
+        else:
+            raise ValueError(f"Unknown journal op: {op}")
+
+    def save(self, config):
+        self._transaction(self._write_all, config)
+
+    def _write_all(self, config):
+        # The generation counter survives so other processes still see a change
+        self.conn.execute("DELETE FROM meta WHERE key != 'generation'")
+        for table in ("servers", "resources", "pods"):
+            self.conn.execute(f"DELETE FROM {table}")
+        for key, value in config.items():
+            if key not in ("servers", "journal_seq"):
+                self.conn.execute("INSERT INTO meta(key, value) VALUES(?, ?)", (key, json.dumps(value)))
+        for server in config.get("servers", []):
+            self._upsert_server(server)
+            self._write_resources(server["id"], server)
+            for pod in server.get("pods", []):
+                self._upsert_pod(server["id"], pod)
+
+    def _upsert_server(self, server):
+        data = {k: v for k, v in server.items() if k not in ("pods", "resources")}
+        self.conn.execute(
+            "INSERT INTO servers(id, name, type, environment, status, data) VALUES(?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, type = excluded.type, "
+            "environment = excluded.environment, status = excluded.status, data = excluded.data",
+            (server["id"], server.get("name"), server.get("type"), server.get("environment"),
+             server.get("status"), json.dumps(data))
+        )
+
+    def _write_resources(self, server_id, server):
+        resources = server.get("resources", {})
+        for bucket in RESOURCE_BUCKETS:
+            for resource, amount in resources.get(bucket, {}).items():
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO resources(server_id, bucket, resource, amount) VALUES(?, ?, ?, ?)",
+                    (server_id, bucket, resource, amount)
+                )
+
+    def _upsert_pod(self, server_id, pod):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pods(server_id, pod_id, namespace, status, image_url, data) "
+            "VALUES(?, ?, ?, ?, ?, ?)",
+            (server_id, pod["pod_id"], pod.get("namespace"), pod.get("status"), pod.get("image_url"),
+             json.dumps(pod))
+        )
+
+    def signature(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            return row[0] if row else None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    """Imports master.json into a SQLite store, or exports a store back to master.json."""
+    parser = argparse.ArgumentParser(description="Convert between master.json and the SQLite store.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        # Goes through StateStore so pending journal entries are replayed first
+        from core.state_store import StateStore
+        config = StateStore(args.source).config
+        SqliteStorage(args.target).save(config)
+    else:
+        config, _ = SqliteStorage(args.source).load()
+        with open(args.target, 'w') as f:
+            json.dump(config, f, indent=2)
+    print(f"{args.command}ed {len(config.get('servers', []))} servers: {args.source} -> {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from contextlib import contextmanager, nullcontext
+from threading import RLock as Lock
+from typing import Dict, List, Optional, Tuple
+
+from core.file_lock import InterProcessLock
+from core.storage import open_storage
+
+RESOURCE_KEYS = ["cpus", "ram_gb", "storage_gb", "gpus"]
+
+
+class StateStore:
+    """In-memory, indexed copy of the master config.
+
+    State is loaded once from the storage backend and then kept authoritative
+    in process. It is only re-read when the backend's signature changes, e.g.
+    after a manual edit of master.json, so read paths no longer pay for a
+    full parse on every request.
+
+    Mutations go through commit(): they are applied in memory and handed to
+    the backend as small entries (pod_added, pod_removed, pod_updated,
+    server_updated, or a batch of those) instead of rewriting the whole
+    document.
+
+    With shared=True several processes (e.g. gunicorn workers) can use the
+    same store: commits and refreshes run under an fcntl lock file, catch up
+    with entries written by other processes first, and are written through
+    before the lock is released. That lock is the only guard: every
+    read-modify-write runs inside transaction(), so no write can land
+    between its read and its commit.
+    """
+
+    def __init__(self, config_path, backend=None, shared=False):
+        self.config_path = config_path
+        self.lock = Lock()
+        self.config = {"servers": [], "config": {}}
+        self.servers_by_id: Dict[str, Dict] = {}
+        self.pods_by_key: Dict[Tuple[str, str], Dict] = {}
+        self.backend = backend or open_storage(config_path)
+        self.shared = shared
+        self.file_lock = InterProcessLock(config_path + ".lock") if shared else nullcontext()
+        # Bumped on every full load, so owners can tell when to rebuild derived state
+        self.load_count = 0
+        self._signature = None
+        with self.file_lock:
+            self.load()
+
+    def load(self):
+        """Loads the stored state, replays pending entries and rebuilds the indexes."""
+        with self.lock:
+            self.config, entries = self.backend.load()
+            self.reindex()
+            for entry in entries:
+                self._apply(entry)
+            self._signature = self.backend.signature()
+            self.load_count += 1
+
+    def refresh_if_changed(self) -> bool:
+        """Catches up with changes made by others since we last touched the store.
+
+        Entries appended by other processes are applied incrementally; anything
+        else (a compaction, a manual edit) triggers a full load.
+        """
+        with self.lock:
+            if self.backend.signature() == self._signature:
+                return False
+            with self.file_lock:
+                entries = self.backend.read_new_entries()
+                if entries is None:
+                    self.load()
+                else:
+                    for entry in entries:
+                        self._apply(entry)
+                    self._signature = self.backend.signature()
+            return True
+
+    @contextmanager
+    def transaction(self):
+        """Holds the store lock (and in shared mode the file lock) across a read-modify-write."""
+        with self.lock, self.file_lock:
+            yield self
+
+    def commit(self, entry: Dict, durable=True):
+        """Applies a mutation in memory and persists it through the backend.
+
+        With durable=True this also waits for the flush barrier (outside the
+        store lock, so concurrent commits share one write). Callers holding
+        their own lock should pass durable=False and call flush() after
+        releasing it. Returns whatever the mutation produced (e.g. the removed
+        pod), or None.
+        """
+        with self.lock, self.file_lock:
+            self.refresh_if_changed()
+            result = self._apply(entry)
+            self.backend.commit(entry, self)
+            if self.shared:
+                # Other processes must see the entry before we give up the file lock
+                self.backend.flush()
+            # Our own write must not look like an external change
+            self._signature = self.backend.signature()
+        if durable:
+            self.flush()
+        return result
+
+    def flush(self, timeout=None):
+        """Waits until every committed mutation is durable."""
+        return self.backend.flush(timeout=timeout)
+
+    def save(self):
+        """Persists a full copy of the in-memory state."""
+        with self.lock, self.file_lock:
+            self.backend.save(self.config)
+            self._signature = self.backend.signature()
+
+    def _apply(self, entry: Dict):
+        """Applies a single journal entry to the in-memory state."""
+        op = entry["op"]
+        if op == "batch":
+            # Several mutations persisted as a single entry
+            return [self._apply(e) for e in entry["entries"]]
+        server_id = entry["server_id"]
+        server = self.servers_by_id.get(server_id)
+        if server is None:
+            print(f"Journal entry {op} for unknown server {server_id}, skipping")
+            return None
+
+        if op == "pod_added":
+            pod = entry["pod"]
+            # Replaces a record with the same pod id rather than keeping both
+            previous = self.remove_pod(server_id, pod["pod_id"])
+            if previous:
+                self._adjust_resources(server, previous.get("requested", {}), sign=1)
+            self.add_pod(server_id, pod)
+            self._adjust_resources(server, pod.get("requested", {}), sign=-1)
+            return pod
+        if op == "pod_removed":
+            pod = self.remove_pod(server_id, entry["pod_id"])
+            if pod:
+                self._adjust_resources(server, pod.get("requested", {}), sign=1)
+            return pod
+        if op == "pod_updated":
+            pod = self.get_pod(server_id, entry["pod_id"])
+            if pod:
+                pod.update(entry["fields"])
+            return pod
+        if op == "server_updated":
+            server.update(entry["fields"])
+            return server
+        raise ValueError(f"Unknown journal op: {op}")
+
+    @staticmethod
+    def _adjust_resources(server, requested, sign):
+        """Moves requested resources between available and allocated (sign=-1 deducts)."""
+        resources = server.setdefault("resources", {})
+        avail = resources.setdefault("available", {})
+        alloc = resources.setdefault("allocated", {})
+        for k in RESOURCE_KEYS:
+            val = requested.get(k, 0)
+            if sign < 0:
+                if k in avail: avail[k] = max(0, avail[k] - val)
+                if k in alloc: alloc[k] += val
+            else:
+                if k in avail: avail[k] += val
+                if k in alloc: alloc[k] = max(0, alloc[k] - val)
+
+    def reindex(self):
+        """Rebuilds the server and (server, pod) indexes from self.config."""
+        with self.lock:
+            self.servers_by_id = {}
+            self.pods_by_key = {}
+            for server in self.config.get("servers", []):
+                server_id = server.get("id")
+                self.servers_by_id[server_id] = server
+                for pod in server.get("pods", []):
+                    self.pods_by_key[(server_id, pod.get("pod_id"))] = pod
+
+    def servers(self) -> List[Dict]:
+        return self.config.get("servers", [])
+
+    def get_server(self, server_id) -> Optional[Dict]:
+        return self.servers_by_id.get(server_id)
+
+    def get_pod(self, server_id, pod_id) -> Optional[Dict]:
+        return self.pods_by_key.get((server_id, pod_id))
+
+    def add_pod(self, server_id, pod_object):
+        """Appends a pod to a server and indexes it."""
+        with self.lock:
+            server = self.servers_by_id[server_id]
+            server.setdefault("pods", []).append(pod_object)
+            self.pods_by_key[(server_id, pod_object["pod_id"])] = pod_object
+
+    def remove_pod(self, server_id, pod_id) -> Optional[Dict]:
+        """Removes a pod from a server and its index. Returns the removed pod."""
+        with self.lock:
+            pod = self.pods_by_key.pop((server_id, pod_id), None)
+            if pod is not None:
+                self.servers_by_id[server_id]["pods"].remove(pod)
+            return pod
@@ -0,0 +1,156 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from core.journal import MutationJournal
+from core.persistence import atomic_write_json
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+class StorageBackend:
+    """Persistence interface behind StateStore.
+
+    StateStore keeps the authoritative state in memory and applies mutation
+    entries itself; a backend only has to load that state, persist each
+    committed entry, and write a full copy when asked.
+    """
+
+    def load(self) -> Tuple[Dict, List[Dict]]:
+        """Returns the stored master config and any entries still to be replayed on top of it."""
+        raise NotImplementedError
+
+    def commit(self, entry: Dict, store):
+        """Persists one mutation entry that StateStore has already applied in memory.
+
+        Backends may buffer the write; flush() waits until it is durable.
+        """
+        raise NotImplementedError
+
+    def flush(self, timeout=None):
+        """Durability barrier: returns once every commit so far is on disk."""
+        return True
+
+    def save(self, config: Dict):
+        """Persists a full copy of the master config."""
+        raise NotImplementedError
+
+    def signature(self):
+        """Cheap token that changes whenever the stored state is changed by anyone."""
+        raise NotImplementedError
+
+    def read_new_entries(self):
+        """Entries written by other processes since our last load/read.
+
+        Returns None if the change cannot be applied incrementally and the
+        caller has to load() again.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class JsonStorage(StorageBackend):
+    """master.json snapshot plus an fsynced mutation journal next to it.
+
+    The journal is folded into a new snapshot once it grows past
+    compact_bytes/compact_entries or compact_interval seconds have passed.
+    The snapshot records the last journal seq it contains, so entries that
+    survive a crash between writing the snapshot and truncating the journal
+    are skipped on replay. Journal appends within flush_window seconds are
+    coalesced into a single write and fsync.
+    """
+
+    def __init__(self, config_path, compact_bytes=1024 * 1024, compact_entries=1000, compact_interval=600,
+                 flush_window=0.02):
+        self.config_path = config_path
+        self.journal = MutationJournal(config_path + ".journal", flush_window=flush_window)
+        self.compact_bytes = compact_bytes
+        self.compact_entries = compact_entries
+        self.compact_interval = compact_interval
+        self._seq = 0
+        self._pending_entries = 0
+        self._last_compaction = time.time()
+        self._snapshot_signature = None
+        self._journal_offset = 0
+
+    def load(self):
+        self._snapshot_signature = self._snapshot_stat()
+        if os.path.exists(self.config_path):
+            with open(self.config_path, 'r') as f:
+                config = json.load(f)
+        else:
+            config = {"servers": [], "config": {}}
+
+        # Entries up to journal_seq are already part of the snapshot.
+        # Our own buffered appends must reach the file before we re-read it.
+        self.journal.flush()
+        self._seq = config.get("journal_seq", 0)
+        entries = [e for e in self.journal.read() if e.get("seq", 0) > self._seq]
+        if entries:
+            self._seq = entries[-1]["seq"]
+        self._pending_entries = len(entries)
+        self._journal_offset = self.journal.size()
+        return config, entries
+
+    def read_new_entries(self):
+        if self._snapshot_stat() != self._snapshot_signature:
+            return None  # Another process compacted or the file was edited
+        if self.journal.size() < self._journal_offset:
+            return None
+        entries, self._journal_offset = self.journal.read_from(self._journal_offset)
+        # Our own appends are already applied and carry seq <= self._seq
+        entries = [e for e in entries if e.get("seq", 0) > self._seq]
+        if entries:
+            self._seq = entries[-1]["seq"]
+            self._pending_entries += len(entries)
+        return entries
+
+    def commit(self, entry, store):
+        self._seq += 1
+        self.journal.append({"seq": self._seq, "ts": datetime.now().isoformat(), **entry})
+        self._pending_entries += 1
+        if self._should_compact():
+            self.save(store.config)
+
+    def flush(self, timeout=None):
+        return self.journal.flush(timeout=timeout)
+
+    def _should_compact(self) -> bool:
+        return (self._pending_entries >= self.compact_entries or
+                self.journal.size() >= self.compact_bytes or
+                time.time() - self._last_compaction >= self.compact_interval)
+
+    def save(self, config):
+        """Writes a full master.json snapshot and empties the journal."""
+        config["journal_seq"] = self._seq
+        atomic_write_json(self.config_path, config)
+        self.journal.reset()
+        self._snapshot_signature = self._snapshot_stat()
+        self._journal_offset = 0
+        self._pending_entries = 0
+        self._last_compaction = time.time()
+
+    def _snapshot_stat(self):
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def signature(self):
+        return (self._snapshot_stat(), self.journal.signature())
+
+    def close(self):
+        self.journal.close()
+
+
+def open_storage(path, flush_window=0.02) -> StorageBackend:
+    """Picks a backend from the path: SQLite for .db/.sqlite/.sqlite3, master.json otherwise."""
+    if path.endswith(SQLITE_EXTENSIONS):
+        from core.sqlite_storage import SqliteStorage
+        return SqliteStorage(path)
+    return JsonStorage(path, flush_window=flush_window)
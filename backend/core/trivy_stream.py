@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import json
+import re
+
+SEVERITIES = ("Critical", "High", "Medium", "Low", "Unknown")
+MAX_VULNERABILITIES = 1000
+
+# One JSON token: a complete string, a structural character, or a bare scalar (number, true, ...)
+TOKEN_RE = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|([{}\[\]:,])|([^\s{}\[\]:,"]+))')
+WHITESPACE_RE = re.compile(r'\s*')
+
+VULNERABILITY_PATH = ("Results", "*", "Vulnerabilities", "*")
+REPO_DIGESTS_PATH = ("Metadata", "RepoDigests")
+
+
+class TrivyReportParser:
+    """Incremental parser for `trivy image --format json` output.
+
+    feed() takes stdout as it arrives. Only the document structure is walked
+    token by token; each vulnerability object is decoded on its own with
+    raw_decode, counted by severity and dropped unless it is among the
+    MAX_VULNERABILITIES most severe seen so far. Memory stays bounded by one
+    vulnerability plus the kept entries, however large the report is.
+
+    Anything printed before the JSON document (trivy notices) is skipped.
+    With collect_findings, every distinct (CVE, package, installed version,
+    severity) is also kept as a small tuple for the scan history index.
+    """
+
+    def __init__(self, max_vulnerabilities=MAX_VULNERABILITIES, collect_findings=False):
+        self.max_vulnerabilities = max_vulnerabilities
+        self.findings = set() if collect_findings else None
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.prefix = ()
+        # Open containers: [kind, current key, state]
+        self.stack = []
+        self.summary = {s: 0 for s in SEVERITIES}
+        self.repo_digests = []
+        # Min-heap of (-rank, -seq, entry): the root is the least severe entry kept
+        self.kept = []
+        self.seq = itertools.count()
+
+    def feed(self, chunk):
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self._parse(final=False)
+
+    def close(self):
+        """Parses what is left; raises ValueError if no complete JSON document was read."""
+        self._parse(final=True)
+        if not self.started:
+            raise ValueError("no JSON document in trivy output")
+        if not self.done:
+            raise ValueError("trivy output ended in the middle of the JSON document")
+
+    @property
+    def total(self):
+        return sum(self.summary.values())
+
+    def vulnerabilities(self):
+        """Kept entries, most severe first (in report order within a severity)."""
+        return [entry for _, _, entry in sorted(self.kept, key=lambda item: (-item[0], -item[1]))]
+
+    def partial(self):
+        return {"summary": dict(self.summary), "total": self.total}
+
+    def _parse(self, final):
+        if not self.started:
+            start = min((i for i in (self.buf.find('{', self.pos), self.buf.find('[', self.pos)) if i != -1),
+                        default=-1)
+            if start == -1:
+                self.pos = len(self.buf)
+                return
+            self.started = True
+            self.pos = start
+            # Old trivy versions print the Results array as the whole document
+            self.prefix = ("Results",) if self.buf[start] == '[' else ()
+        while not self.done:
+            if not self._step(final):
+                return
+
+    def _path(self):
+        return self.prefix + tuple('*' if kind == 'arr' else key for kind, key, _ in self.stack)
+
+    def _step(self, final):
+        """Consumes one token or value; returns False when more input is needed."""
+        if self.stack and self.stack[-1][2] == 'value':
+            path = self._path()
+            if path == VULNERABILITY_PATH or path == REPO_DIGESTS_PATH:
+                return self._decode_value(path, final)
+        match = TOKEN_RE.match(self.buf, self.pos)
+        if not match or (not final and match.end() == len(self.buf) and match.group(3) is not None):
+            if final and WHITESPACE_RE.match(self.buf, self.pos).end() != len(self.buf):
+                raise ValueError(f"invalid JSON near offset {self.pos}")
+            return False
+        string, punct, scalar = match.groups()
+        self.pos = match.end()
+        if not self.stack:
+            self._open(punct)
+            return True
+        kind, key, state = self.stack[-1]
+        if state == 'value':
+            if punct in ('{', '['):
+                self._open(punct)
+            elif string is not None or scalar is not None:
+                self._value_done()
+            elif punct == ']' and kind == 'arr' and key == 'empty':
+                self._close()
+            else:
+                raise ValueError(f"unexpected '{punct}' in trivy output")
+        elif state == 'key':
+            if string is not None:
+                self.stack[-1][1] = json.loads(string)
+                self.stack[-1][2] = 'colon'
+            elif punct == '}' and key is None:
+                self._close()
+            else:
+                raise ValueError("expected an object key in trivy output")
+        elif state == 'colon':
+            if punct != ':':
+                raise ValueError("expected ':' in trivy output")
+            self.stack[-1][2] = 'value'
+        else:  # after a value
+            if punct == ',':
+                self.stack[-1][2] = 'key' if kind == 'obj' else 'value'
+                if kind == 'arr':
+                    self.stack[-1][1] = None
+            elif punct == ('}' if kind == 'obj' else ']'):
+                self._close()
+            else:
+                raise ValueError("expected ',' or the end of a container in trivy output")
+        return True
+
+    def _open(self, punct):
+        if punct == '{':
+            self.stack.append(['obj', None, 'key'])
+        elif punct == '[':
+            # 'empty' lets the first token be the closing bracket
+            self.stack.append(['arr', 'empty', 'value'])
+        else:
+            raise ValueError("expected a JSON object or array in trivy output")
+
+    def _close(self):
+        self.stack.pop()
+        if self.stack:
+            self._value_done()
+        else:
+            self.done = True
+
+    def _value_done(self):
+        frame = self.stack[-1]
+        frame[2] = 'after'
+        if frame[0] == 'arr':
+            frame[1] = None
+
+    def _decode_value(self, path, final):
+        start = WHITESPACE_RE.match(self.buf, self.pos).end()
+        if start < len(self.buf) and self.buf[start] == ']' and self.stack[-1][1] == 'empty':
+            self.pos = start + 1
+            self._close()
+            return True
+        try:
+            value, end = self.decoder.raw_decode(self.buf, start)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError(f"invalid JSON near offset {start}")
+            # Most likely cut off mid-object: wait for the rest
+            return False
+        self.pos = end
+        if path == REPO_DIGESTS_PATH:
+            self.repo_digests = value or []
+        elif isinstance(value, dict):
+            self._add_vulnerability(value)
+        self._value_done()
+        return True
+
+    def _add_vulnerability(self, vuln):
+        # Trivy severities are UPPERCASE; normalize to the Title case of the summary keys
+        severity = (vuln.get("Severity") or "Unknown").title()
+        counted = severity if severity in self.summary else "Unknown"
+        self.summary[counted] += 1
+        if self.findings is not None:
+            self.findings.add((vuln.get("VulnerabilityID"), vuln.get("PkgName"),
+                               vuln.get("InstalledVersion"), severity))
+        if self.max_vulnerabilities <= 0:
+            return
+        rank = SEVERITIES.index(counted)
+        item = (-rank, -next(self.seq), {
+            "id": vuln.get("VulnerabilityID"),
+            "pkg": vuln.get("PkgName"),
+            "severity": severity,
+            "title": vuln.get("Title", "No title")
+        })
+        if len(self.kept) < self.max_vulnerabilities:
+            heapq.heappush(self.kept, item)
+        elif item[0] > self.kept[0][0]:
+            # More severe than the least severe entry kept
+            heapq.heapreplace(self.kept, item)
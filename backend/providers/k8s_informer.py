@@ -0,0 +1,172 @@
+import threading
+from collections import defaultdict
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+
+def _namespace_of(obj):
+    return [obj.metadata.namespace] if obj.metadata.namespace else []
+
+def _app_label_of(obj):
+    labels = obj.metadata.labels or {}
+    return [labels["app"]] if "app" in labels else []
+
+def _node_of(pod):
+    return [pod.spec.node_name] if pod.spec and pod.spec.node_name else []
+
+
+class Informer:
+    """Keeps a local, indexed copy of one resource kind in sync via list + watch.
+
+    A background thread lists the resource once, then applies watch events
+    from that resourceVersion. Reads are served from memory while `synced`
+    is set. A failed watch clears it until the relist that follows succeeds,
+    since events are missed in between, so callers fall back to the API
+    instead of reading a cache that has stopped following the cluster.
+    """
+
+    def __init__(self, name, list_fn, indexers=None, watch_timeout=300, retry_backoff=5):
+        self.name = name
+        self.list_fn = list_fn
+        self.indexers = indexers or {}
+        self.watch_timeout = watch_timeout
+        self.retry_backoff = retry_backoff
+        self.lock = threading.RLock()
+        self.items = {}
+        self.indexes = {index: defaultdict(set) for index in self.indexers}
+        self.synced = threading.Event()
+        self._stop = threading.Event()
+        self._watch = None
+        self._thread = None
+
+    @staticmethod
+    def _key(obj):
+        return (obj.metadata.namespace, obj.metadata.name)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"informer-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watch:
+            self._watch.stop()
+
+    def _run(self):
+        resource_version = None
+        while not self._stop.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._relist()
+                self._watch = watch.Watch()
+                for event in self._watch.stream(self.list_fn, resource_version=resource_version,
+                                                allow_watch_bookmarks=True,
+                                                timeout_seconds=self.watch_timeout,
+                                                _request_timeout=self.watch_timeout + 30):
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    if event["type"] == "DELETED":
+                        self._delete(obj)
+                    elif event["type"] in ("ADDED", "MODIFIED"):
+                        self._store(obj)
+                    if self._stop.is_set():
+                        break
+            except ApiException as e:
+                if e.status != 410:
+                    self._failed(e)
+                # 410 Gone: our resourceVersion was compacted, relist
+                resource_version = None
+            except Exception as e:
+                self._failed(e)
+                resource_version = None
+
+    def _failed(self, error):
+        if self.synced.is_set():
+            print(f"Informer {self.name} watch failed, reads go to the API until it relists: {error}")
+            self.synced.clear()
+        else:
+            print(f"Informer {self.name} watch failed: {error}")
+        self._stop.wait(self.retry_backoff)
+
+    def _relist(self):
+        resp = self.list_fn(_request_timeout=60)
+        with self.lock:
+            self.items = {}
+            self.indexes = {index: defaultdict(set) for index in self.indexers}
+            for obj in resp.items:
+                self._store(obj)
+        self.synced.set()
+        return resp.metadata.resource_version
+
+    def _store(self, obj):
+        with self.lock:
+            key = self._key(obj)
+            self._unindex(key)
+            self.items[key] = obj
+            for index, fn in self.indexers.items():
+                for value in fn(obj):
+                    self.indexes[index][value].add(key)
+
+    def _delete(self, obj):
+        with self.lock:
+            key = self._key(obj)
+            self._unindex(key)
+            self.items.pop(key, None)
+
+    def _unindex(self, key):
+        old = self.items.get(key)
+        if old is None:
+            return
+        for index, fn in self.indexers.items():
+            for value in fn(old):
+                keys = self.indexes[index].get(value)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.indexes[index][value]
+
+    def get(self, name, namespace=None):
+        with self.lock:
+            return self.items.get((namespace, name))
+
+    def list(self, **filters):
+        """Returns cached objects matching every given index filter, e.g. list(namespace="x", app="y")."""
+        with self.lock:
+            if not filters:
+                return list(self.items.values())
+            keys = None
+            for index, value in filters.items():
+                matched = self.indexes[index].get(value, set())
+                keys = set(matched) if keys is None else keys & matched
+            return [self.items[k] for k in keys]
+
+
+class ClusterInformer:
+    """Informers for the resources of one cluster that read paths serve from cache.
+
+    Only pods are cached: every watch is a long-lived connection and a full
+    copy of the resource, so a kind is added here with the reads that use it.
+    """
+
+    def __init__(self, core_v1):
+        self.pods = Informer("pods", core_v1.list_pod_for_all_namespaces,
+                             indexers={"namespace": _namespace_of, "app": _app_label_of, "node": _node_of})
+        self.informers = [self.pods]
+
+    def start(self):
+        for informer in self.informers:
+            informer.start()
+
+    def stop(self):
+        for informer in self.informers:
+            informer.stop()
+
+    def has_synced(self):
+        return all(informer.synced.is_set() for informer in self.informers)
+
+    def wait_for_sync(self, timeout=None):
+        return all(informer.synced.wait(timeout) for informer in self.informers)
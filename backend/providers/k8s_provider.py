@@ -1,34 +1,167 @@
-from kubernetes import client, config as k8s_config
+from concurrent.futures import ThreadPoolExecutor
+from kubernetes import client, config as k8s_config, watch
 from kubernetes.client.rest import ApiException
+from providers.k8s_informer import ClusterInformer
+from providers.log_merge import MergedLogStream, merge_by_timestamp
+import time
 import uuid
 
+# Defaults for each provider's dedicated connection pool
+DEFAULT_POOL_MAXSIZE = 8
+# (connect, read) timeout in seconds applied to every API call
+DEFAULT_REQUEST_TIMEOUT = (5, 30)
+
 class K8sProvider:
     """Interacts with Kubernetes clusters."""
 
-    def __init__(self, kubeconfig_data=None):
+    def __init__(self, kubeconfig_data=None, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        # Each provider owns its Configuration/ApiClient instead of loading into
+        # the process-global default, so providers for different clusters can be
+        # used from parallel threads without pointing at each other's cluster.
+        configuration = client.Configuration()
         if kubeconfig_data:
-            # For remote servers, we'd load from dict, but for V2 initial setup
-            # we'll assume local kubeconfig if data is None
-            k8s_config.load_kube_config_from_dict(kubeconfig_data)
+            k8s_config.load_kube_config_from_dict(kubeconfig_data, client_configuration=configuration)
         else:
             try:
-                k8s_config.load_kube_config()
+                k8s_config.load_kube_config(client_configuration=configuration)
             except:
                 # Fallback or error handled at higher level
                 pass
-        
-        self.core_v1 = client.CoreV1Api()
-        self.apps_v1 = client.AppsV1Api()
-        self.networking_v1 = client.NetworkingV1Api()
+        configuration.connection_pool_maxsize = pool_maxsize
+
+        self.pool_maxsize = pool_maxsize
+        self.request_timeout = request_timeout
+        self.api_client = client.ApiClient(configuration)
+        self.core_v1 = client.CoreV1Api(self.api_client)
+        self.apps_v1 = client.AppsV1Api(self.api_client)
+        self.networking_v1 = client.NetworkingV1Api(self.api_client)
+        self.informer = None
+
     def _ensure_initialized(self):
         if not hasattr(self, 'core_v1') or not self.core_v1:
             try:
-                self.core_v1 = client.CoreV1Api()
-                self.apps_v1 = client.AppsV1Api()
-                self.networking_v1 = client.NetworkingV1Api()
+                self.core_v1 = client.CoreV1Api(self.api_client)
+                self.apps_v1 = client.AppsV1Api(self.api_client)
+                self.networking_v1 = client.NetworkingV1Api(self.api_client)
             except Exception as e:
                 raise Exception(f"K8s client not initialized: {e}")
 
+    def start_informer(self):
+        """Starts the shared list+watch cache of the cluster's pods."""
+        if self.informer is None:
+            self.informer = ClusterInformer(self.core_v1)
+        self.informer.start()
+        return self.informer
+
+    def _synced(self, name):
+        """Returns the named informer if it is cached and in sync (listed, and the watch since has not failed).
+
+        None means the caller has to read from the API.
+        """
+        if self.informer is None:
+            return None
+        informer = getattr(self.informer, name, None)
+        return informer if informer is not None and informer.synced.is_set() else None
+
+    def list_cached_pods(self, **filters):
+        """Pods from the informer cache (filters: namespace, app, node), or None if not synced."""
+        pods = self._synced("pods")
+        return pods.list(**filters) if pods else None
+
+    def close(self):
+        """Releases this provider's connection pool."""
+        if self.informer is not None:
+            self.informer.stop()
+        try:
+            self.api_client.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _pod_is_ready(pod):
+        """True if the pod is Running and all its containers report ready."""
+        if not pod.status or pod.status.phase != "Running":
+            return False
+        container_statuses = pod.status.container_statuses or []
+        return bool(container_statuses) and all(cs.ready for cs in container_statuses)
+
+    @staticmethod
+    def _rollout_complete(dep):
+        """True once the deployment controller has fully rolled out the latest generation."""
+        replicas = dep.spec.replicas or 1
+        status = dep.status
+        if not status or status.observed_generation is None:
+            return False
+        # 1. observedGeneration >= generation
+        # 2. updatedReplicas == replicas
+        # 3. availableReplicas == replicas
+        return (status.observed_generation >= dep.metadata.generation and
+                status.updated_replicas == replicas and
+                status.available_replicas == replicas)
+
+    def _wait_for(self, list_fn, predicate, timeout, **list_kwargs):
+        """Waits until an object returned by list_fn satisfies predicate.
+
+        Uses a list+watch so we wake up as soon as the condition flips. If the
+        watch cannot be established or breaks, falls back to polling for the
+        remaining time. Returns the matching object, or None on timeout.
+        """
+        start = time.time()
+        try:
+            return self._watch_until(list_fn, predicate, timeout, **list_kwargs)
+        except Exception as e:
+            print(f"Watch failed, falling back to polling: {e}")
+        return self._poll_until(list_fn, predicate, timeout - (time.time() - start), **list_kwargs)
+
+    def _watch_until(self, list_fn, predicate, timeout, **list_kwargs):
+        deadline = time.time() + timeout
+
+        def relist():
+            resp = list_fn(_request_timeout=self.request_timeout, **list_kwargs)
+            match = next((item for item in resp.items if predicate(item)), None)
+            return match, resp.metadata.resource_version
+
+        match, resource_version = relist()
+        while match is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            w = watch.Watch()
+            try:
+                # Resume from the last resourceVersion we have seen
+                for event in w.stream(list_fn, resource_version=resource_version,
+                                      timeout_seconds=max(1, int(remaining)),
+                                      _request_timeout=remaining + 5,
+                                      **list_kwargs):
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    if event["type"] in ("ADDED", "MODIFIED") and predicate(obj):
+                        return obj
+                    if time.time() >= deadline:
+                        return None
+            except ApiException as e:
+                if e.status != 410:
+                    raise
+                # resourceVersion too old (compacted): start over from a fresh list
+                match, resource_version = relist()
+            finally:
+                w.stop()
+        return match
+
+    def _poll_until(self, list_fn, predicate, timeout, interval=2, **list_kwargs):
+        start = time.time()
+        while time.time() - start < timeout:
+            try:
+                resp = list_fn(_request_timeout=self.request_timeout, **list_kwargs)
+                for item in resp.items:
+                    if predicate(item):
+                        return item
+            except Exception:
+                pass
+            time.sleep(interval)
+        return None
+
     def create_service(self, namespace, app_name, port=80):
         """Creates a ClusterIP service for the app."""
         try:
@@ -40,7 +173,7 @@ class K8sProvider:
                     type="ClusterIP"
                 )
             )
-            self.core_v1.create_namespaced_service(namespace=namespace, body=service)
+            self.core_v1.create_namespaced_service(namespace=namespace, body=service, _request_timeout=self.request_timeout)
             print(f"Service {app_name} created in {namespace}.")
             return True
         except ApiException as e:
@@ -79,7 +212,7 @@ class K8sProvider:
                 )
             )
             
-            self.networking_v1.create_namespaced_ingress(namespace=namespace, body=ingress)
+            self.networking_v1.create_namespaced_ingress(namespace=namespace, body=ingress, _request_timeout=self.request_timeout)
             print(f"Ingress {app_name} created for path {path}.")
             return True
         except ApiException as e:
@@ -89,14 +222,25 @@ class K8sProvider:
             print(f"Failed to create ingress: {e}")
             raise
 
-    def create_pod(self, pod_data):
-        """Create multiple pod replicas in a dynamic namespace (from payload or default to 'default')."""
+    @staticmethod
+    def _report(progress_callback, stage, state, detail=None):
+        """Forwards a provisioning stage update to the caller, if it asked for one."""
+        if progress_callback:
+            try:
+                progress_callback(stage, state, detail)
+            except Exception as e:
+                print(f"Progress callback failed for stage {stage}: {e}")
+
+    def create_pod(self, pod_data, progress_callback=None):
+        """Create multiple pod replicas in a dynamic namespace (from payload or default to 'default').
+
+        progress_callback(stage, state, detail) is called as the namespace,
+        deployment, service, ingress and ready stages progress.
+        """
         self._ensure_initialized()
         print(f"Creating pod with data: {pod_data}")
+        stage = "namespace"
         try:
-            import uuid
-            import time
-
             base_name = pod_data.get("pod_id") or f"deployment-{uuid.uuid4().hex[:8]}"
             resources = pod_data.get("requested", {}) or {}
             image_url = pod_data.get("image_url", "nginx:latest")
@@ -104,14 +248,16 @@ class K8sProvider:
             replicas = pod_data.get("replicas", 1)
 
             # Ensure namespace exists (skip default)
+            self._report(progress_callback, "namespace", "in_progress")
             if namespace != "default":
                 try:
-                    self.core_v1.read_namespace(namespace)
+                    self.core_v1.read_namespace(namespace, _request_timeout=self.request_timeout)
                 except Exception:
                     ns_body = client.V1Namespace(
                         metadata=client.V1ObjectMeta(name=namespace)
                     )
-                    self.core_v1.create_namespace(ns_body)
+                    self.core_v1.create_namespace(ns_body, _request_timeout=self.request_timeout)
+            self._report(progress_callback, "namespace", "done", namespace)
 
             # Build resource requests
             resource_requests = {}
@@ -124,10 +270,16 @@ class K8sProvider:
                     f"{resources.get('storage_gb', 1)}Gi"
                 )
 
+            # GPUs are extended resources and must be set as limits
+            resource_limits = {}
+            if resources.get("gpus", 0):
+                resource_limits["nvidia.com/gpu"] = str(int(resources["gpus"]))
+
             resource_requirements = None
-            if resource_requests:
+            if resource_requests or resource_limits:
                 resource_requirements = client.V1ResourceRequirements(
-                    requests=resource_requests
+                    requests=resource_requests or None,
+                    limits=resource_limits or None,
                 )
 
             # Define container
@@ -155,9 +307,13 @@ class K8sProvider:
             )
 
             # Create deployment
+            stage = "deployment"
+            self._report(progress_callback, "deployment", "in_progress")
             self.apps_v1.create_namespaced_deployment(
-                namespace=namespace, body=deployment
+                namespace=namespace, body=deployment,
+                _request_timeout=self.request_timeout
             )
+            self._report(progress_callback, "deployment", "done", base_name)
 
             # Ingress / Route Support
             route_path = pod_data.get("route")
@@ -166,40 +322,34 @@ class K8sProvider:
             if route_path:
                 try:
                     print(f"Debug: Creating service/ingress for {base_name} at {route_path} in {namespace}")
+                    stage = "service"
+                    self._report(progress_callback, "service", "in_progress")
                     self.create_service(namespace, base_name)
+                    self._report(progress_callback, "service", "done")
+                    stage = "ingress"
+                    self._report(progress_callback, "ingress", "in_progress")
                     self.create_ingress(namespace, base_name, base_name, route_path)
+                    self._report(progress_callback, "ingress", "done", route_path)
                     ingress_details = {"status": "created", "route": route_path}
                 except Exception as e:
                     print(f"Warning: Failed to create ingress/service: {e}")
+                    self._report(progress_callback, stage, "failed", str(e))
                     ingress_details = {"status": "failed", "error": str(e)}
+            else:
+                self._report(progress_callback, "service", "skipped")
+                self._report(progress_callback, "ingress", "skipped")
 
             # Wait for at least one pod to become ready
+            stage = "ready"
+            self._report(progress_callback, "ready", "in_progress")
             timeout = 60  # seconds
-            start = time.time()
-            ready_pod = None
-            label_selector = f"app={base_name}"
-            while time.time() - start < timeout:
-                try:
-                    pods_resp = self.core_v1.list_namespaced_pod(
-                        namespace=namespace, label_selector=label_selector
-                    )
-                except Exception:
-                    pods_resp = None
-
-                if pods_resp and pods_resp.items:
-                    for pod in pods_resp.items:
-                        if pod.status and pod.status.phase == "Running":
-                            container_statuses = pod.status.container_statuses or []
-                            if container_statuses and all(
-                                cs.ready for cs in container_statuses
-                            ):
-                                ready_pod = pod
-                                break
-                    if ready_pod:
-                        break
-                time.sleep(2)
+            ready_pod = self._wait_for(
+                self.core_v1.list_namespaced_pod, self._pod_is_ready, timeout,
+                namespace=namespace, label_selector=f"app={base_name}"
+            )
 
             if not ready_pod:
+                self._report(progress_callback, "ready", "failed", f"no pod ready within {timeout}s")
                 return {
                     "status": "error",
                     "message": f"Deployment {base_name} created but no pod became ready within {timeout}s",
@@ -219,7 +369,7 @@ class K8sProvider:
             node_name = ready_pod.spec.node_name
             if node_name:
                 try:
-                    node_obj = self.core_v1.read_node(node_name)
+                    node_obj = self.core_v1.read_node(node_name, _request_timeout=self.request_timeout)
                     for addr in node_obj.status.addresses or []:
                         if addr.type == "ExternalIP":
                             external_ip = addr.address
@@ -234,7 +384,7 @@ class K8sProvider:
                 istart = time.time()
                 while time.time() - istart < ingress_timeout:
                     try:
-                        ing = self.networking_v1.read_namespaced_ingress(base_name, namespace)
+                        ing = self.networking_v1.read_namespaced_ingress(base_name, namespace, _request_timeout=self.request_timeout)
                         if ing.status and ing.status.load_balancer and ing.status.load_balancer.ingress:
                             ing_entry = ing.status.load_balancer.ingress[0]
                             ing_ip = ing_entry.ip or ing_entry.hostname
@@ -246,6 +396,7 @@ class K8sProvider:
                         pass
                     time.sleep(2)
 
+            self._report(progress_callback, "ready", "done", external_ip)
             return {
                 "status": "success",
                 "message": f"Deployment {base_name} created with {replicas} replicas in namespace {namespace}",
@@ -257,37 +408,131 @@ class K8sProvider:
             }
 
         except ApiException as e:
+            self._report(progress_callback, stage, "failed", str(e))
             return {"status": "error", "message": f"Kubernetes API error: {e}"}
         except Exception as e:
+            self._report(progress_callback, stage, "failed", str(e))
             return {"status": "error", "message": f"Failed to create pod: {e}"}
 
+    def deployment_pods(self, namespace, deployment_name):
+        """Pods of a deployment, from the informer cache when it is synced, otherwise from the API."""
+        pods = self.list_cached_pods(namespace=namespace, app=deployment_name)
+        if pods is None:
+            label_selector = f"app={deployment_name}"
+            pods = self.core_v1.list_namespaced_pod(namespace=namespace, label_selector=label_selector, _request_timeout=self.request_timeout).items
+        return pods
+
+    def running_image_id(self, namespace, deployment_name):
+        """imageID (repo@sha256:...) the deployment's containers are running, from containerStatuses."""
+        self._ensure_initialized()
+        for pod in self.deployment_pods(namespace, deployment_name):
+            statuses = (pod.status.container_statuses or []) if pod.status else []
+            for status in statuses:
+                if status.image_id:
+                    return status.image_id
+        return None
+
+    def open_log_stream(self, namespace, deployment_name, tail_lines=100):
+        """Opens a follow=True log stream for the deployment.
+
+        Returns the raw HTTP response (_preload_content=False); read it with
+        response.stream() and close() it to stop. Only the connect timeout
+        applies, since a followed stream can be idle for a long time. With
+        several replicas, every replica is followed and the lines are merged
+        by timestamp and tagged with their pod name (see MergedLogStream).
+        """
+        self._ensure_initialized()
+        pods = self.deployment_pods(namespace, deployment_name)
+        if not pods:
+            raise LookupError(f"No pods found for deployment {deployment_name} in {namespace}.")
+        connect_timeout = self.request_timeout[0] if isinstance(self.request_timeout, tuple) else self.request_timeout
+
+        def follow(pod_name, timestamps=False):
+            return self.core_v1.read_namespaced_pod_log(
+                name=pod_name,
+                namespace=namespace,
+                follow=True,
+                tail_lines=tail_lines,
+                timestamps=timestamps,
+                _preload_content=False,
+                _request_timeout=(connect_timeout, None)
+            )
+
+        if len(pods) == 1:
+            return follow(pods[0].metadata.name)
+
+        responses = {}
+        try:
+            for pod in pods:
+                responses[pod.metadata.name] = follow(pod.metadata.name, timestamps=True)
+        except Exception:
+            for response in responses.values():
+                response.close()
+            raise
+        return MergedLogStream(responses)
+
     def get_logs(self, namespace, deployment_name, tail_lines=100):
-        """Fetches logs for the first pod found in the deployment."""
+        """Fetches logs for the deployment.
+
+        A single replica's logs are returned as is. With several replicas the
+        last tail_lines of each are fetched concurrently, merged by timestamp
+        and tagged with their pod name.
+        """
         self._ensure_initialized()
         try:
             # Find pods for this deployment
-            label_selector = f"app={deployment_name}"
-            pods = self.core_v1.list_namespaced_pod(namespace=namespace, label_selector=label_selector)
+            pods = self.deployment_pods(namespace, deployment_name)
             
-            if not pods.items:
+            if not pods:
                 return f"No pods found for deployment {deployment_name} in {namespace}."
 
-            # Use the first pod (usually only one if replicas=1)
-            pod_name = pods.items[0].metadata.name
-            return self.core_v1.read_namespaced_pod_log(
-                name=pod_name, 
-                namespace=namespace, 
-                tail_lines=tail_lines
-            )
+            if len(pods) == 1:
+                return self.core_v1.read_namespaced_pod_log(
+                    name=pods[0].metadata.name, 
+                    namespace=namespace, 
+                    tail_lines=tail_lines,
+                    _request_timeout=self.request_timeout
+                )
+
+            lines_by_pod = self.read_timestamped_logs(namespace, pods, tail_lines=tail_lines)
+            return "\n".join(merge_by_timestamp(lines_by_pod))
         except Exception as e:
             return f"Error fetching logs: {str(e)}"
 
 
+    def read_timestamped_logs(self, namespace, pods, since_seconds=None, tail_lines=None):
+        """Reads timestamps=True logs of the given pods concurrently. Returns {pod_name: [lines]}.
+
+        A pod deleted since it was listed has no lines; any other API failure
+        is raised, so it never ends up in a log buffer as a log line.
+        """
+        self._ensure_initialized()
+
+        def fetch(pod_name):
+            try:
+                return self.core_v1.read_namespaced_pod_log(
+                    name=pod_name, namespace=namespace, tail_lines=tail_lines,
+                    since_seconds=since_seconds, timestamps=True,
+                    _request_timeout=self.request_timeout
+                ).splitlines()
+            except ApiException as e:
+                if e.status == 404:
+                    return []
+                raise
+
+        names = [pod.metadata.name for pod in pods]
+        if not names:
+            return {}
+        # Bounded by the connection pool, so replicas do not queue on each other
+        with ThreadPoolExecutor(max_workers=min(len(names), self.pool_maxsize)) as executor:
+            return dict(zip(names, executor.map(fetch, names)))
+
     def _get_pod_events(self, namespace, pod_name):
         try:
             events = self.core_v1.list_namespaced_event(
                 namespace=namespace, 
-                field_selector=f"involvedObject.name={pod_name},involvedObject.kind=Pod"
+                field_selector=f"involvedObject.name={pod_name},involvedObject.kind=Pod",
+                _request_timeout=self.request_timeout
             )
             event_list = []
             for e in events.items:
@@ -320,37 +565,21 @@ class K8sProvider:
             self.apps_v1.patch_namespaced_deployment(
                 name=deployment_name,
                 namespace=namespace,
-                body=patch_body
+                body=patch_body,
+                _request_timeout=self.request_timeout
             )
             
             # Wait for Rollout
-            import time
-            start = time.time()
-            while time.time() - start < timeout:
-                try:
-                    dep = self.apps_v1.read_namespaced_deployment(deployment_name, namespace)
-                    
-                    # specific rollout logic:
-                    # 1. observedGeneration >= generation
-                    # 2. updatedReplicas == replicas
-                    # 3. availableReplicas == replicas
-                    
-                    replicas = dep.spec.replicas or 1
-                    status = dep.status
-                    
-                    if (status.observed_generation >= dep.metadata.generation and
-                        status.updated_replicas == replicas and
-                        status.available_replicas == replicas):
-                        
-                        return {
-                            "status": "success",
-                            "message": f"Deployment updated to {new_image}",
-                            "image": new_image
-                        }
-                except:
-                    pass
-                        
-                time.sleep(2)
+            dep = self._wait_for(
+                self.apps_v1.list_namespaced_deployment, self._rollout_complete, timeout,
+                namespace=namespace, field_selector=f"metadata.name={deployment_name}"
+            )
+            if dep:
+                return {
+                    "status": "success",
+                    "message": f"Deployment updated to {new_image}",
+                    "image": new_image
+                }
                 
             return {"status": "error", "message": f"Timeout waiting for update rollout of {deployment_name}"}
 
@@ -359,15 +588,58 @@ class K8sProvider:
         except Exception as e:
             return {"status": "error", "message": f"Failed to update deployment: {e}"}
 
-    def delete_pod(self, namespace, pod_name):
-        """Deletes the deployment and optionally the namespace."""
+    def delete_pod(self, namespace, pod_name, propagation_policy=None):
+        """Deletes the deployment and optionally the namespace.
+
+        propagation_policy ("Foreground", "Background" or "Orphan") is passed
+        on both deletes. The namespace terminates asynchronously; use
+        wait_namespace_deleted to follow it.
+        """
+        body = client.V1DeleteOptions(propagation_policy=propagation_policy) if propagation_policy else None
         try:
             # Delete deployment
-            self.apps_v1.delete_namespaced_deployment(name=pod_name, namespace=namespace)
-            # Delete namespace (standard V2 isolation strategy)
-            self.core_v1.delete_namespace(name=namespace)
+            self.apps_v1.delete_namespaced_deployment(name=pod_name, namespace=namespace, body=body, _request_timeout=self.request_timeout)
+            # Delete namespace (standard V2 isolation strategy); create_pod never creates "default"
+            if namespace != "default":
+                self.core_v1.delete_namespace(name=namespace, body=body, _request_timeout=self.request_timeout)
             return True
         except ApiException as e:
             if e.status == 404:
                 return False
             raise
+
+    def wait_namespace_deleted(self, namespace, timeout=300):
+        """Waits until a terminating namespace is gone. Returns True if it was removed in time."""
+        self._ensure_initialized()
+        deadline = time.time() + timeout
+        try:
+            resp = self.core_v1.list_namespace(field_selector=f"metadata.name={namespace}",
+                                               _request_timeout=self.request_timeout)
+            if not resp.items:
+                return True
+            w = watch.Watch()
+            try:
+                for event in w.stream(self.core_v1.list_namespace,
+                                      field_selector=f"metadata.name={namespace}",
+                                      resource_version=resp.metadata.resource_version,
+                                      timeout_seconds=max(1, int(timeout)),
+                                      _request_timeout=timeout + 5):
+                    if event["type"] == "DELETED":
+                        return True
+                    if time.time() >= deadline:
+                        break
+            finally:
+                w.stop()
+        except Exception as e:
+            print(f"Namespace watch failed, falling back to polling: {e}")
+        # Watch ended or broke: poll until the namespace 404s
+        while time.time() < deadline:
+            try:
+                self.core_v1.read_namespace(namespace, _request_timeout=self.request_timeout)
+            except ApiException as e:
+                if e.status == 404:
+                    return True
+            except Exception:
+                pass
+            time.sleep(2)
+        return False
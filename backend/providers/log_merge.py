@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import queue
+import re
+import threading
+import time
+
+# Lines read with timestamps=True start with an RFC3339Nano timestamp
+TIMESTAMP_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?Z ")
+
+
+def timestamp_key(timestamp):
+    """Sort key of an RFC3339Nano timestamp (fraction padded to nanoseconds), or "" if it is not one."""
+    match = TIMESTAMP_RE.match(timestamp + " ")
+    if not match:
+        return ""
+    return f"{match.group(1)}.{(match.group(2) or '').ljust(9, '0')[:9]}"
+
+
+def split_timestamp(line):
+    """Splits a timestamps=True log line into (sort_key, timestamp, text).
+
+    Kubernetes trims trailing zeros from the fraction, so the sort key pads
+    it to nanoseconds. Lines without a timestamp get an empty key; callers
+    reuse the previous line's key so continuation lines stay in place.
+    """
+    match = TIMESTAMP_RE.match(line)
+    if not match:
+        return "", "", line
+    timestamp = line[:match.end() - 1]
+    return timestamp_key(timestamp), timestamp, line[match.end():]
+
+
+def format_line(pod_name, timestamp, text):
+    return f"[{pod_name}] {timestamp} {text}" if timestamp else f"[{pod_name}] {text}"
+
+
+def merge_by_timestamp(lines_by_pod):
+    """k-way merge of per-pod log lines (each list already in time order).
+
+    Uses heapq.merge, so only one pending line per pod is held at a time.
+    Yields lines tagged with their pod name.
+    """
+    def keyed(pod_name, lines):
+        last_key = ""
+        for line in lines:
+            sort_key, timestamp, text = split_timestamp(line)
+            last_key = sort_key or last_key
+            yield last_key, pod_name, timestamp, text
+
+    for _, pod_name, timestamp, text in heapq.merge(*(keyed(p, lines) for p, lines in lines_by_pod.items())):
+        yield format_line(pod_name, timestamp, text)
+
+
+class MergedLogStream:
+    """Follows several replicas at once and interleaves their lines by timestamp.
+
+    Each replica's raw follow response is read on its own thread into one
+    bounded queue (a stalled consumer applies backpressure instead of
+    buffering). Lines wait in a heap for `window` seconds, so a slightly late
+    line from another replica can still be put in order, and are then
+    released oldest first. At most `max_buffer` lines are held back.
+
+    Quacks like the urllib3 response of a single stream: stream() yields
+    bytes and close() stops every upstream.
+    """
+
+    def __init__(self, responses, window=1.0, max_buffer=1000, queue_size=1000):
+        self.responses = responses
+        self.window = window
+        self.max_buffer = max_buffer
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def _put(self, item):
+        # Gives up once closed, so readers never block on a consumer that left
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def _read(self, pod_name, response):
+        try:
+            pending = b""
+            for chunk in response.stream(4096):
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    self._put((pod_name, line.decode("utf-8", errors="replace").rstrip("\r")))
+            if pending:
+                self._put((pod_name, pending.decode("utf-8", errors="replace").rstrip("\r")))
+        except Exception as e:
+            if not self.closed:
+                print(f"Log stream of {pod_name} failed: {e}")
+        finally:
+            self._put((pod_name, None))
+
+    def stream(self, chunk_size=None):
+        for pod_name, response in self.responses.items():
+            threading.Thread(target=self._read, args=(pod_name, response),
+                             name=f"log-merge-{pod_name}", daemon=True).start()
+
+        heap = []
+        last_keys = {}
+        seq = itertools.count()
+        open_streams = len(self.responses)
+        while open_streams and not self.closed:
+            try:
+                pod_name, line = self.queue.get(timeout=self.window / 2)
+                if line is None:
+                    open_streams -= 1
+                else:
+                    sort_key, timestamp, text = split_timestamp(line)
+                    sort_key = last_keys[pod_name] = sort_key or last_keys.get(pod_name, "")
+                    heapq.heappush(heap, (sort_key, next(seq), time.time(), pod_name, timestamp, text))
+            except queue.Empty:
+                pass
+            cutoff = time.time() - self.window
+            while heap and (heap[0][2] <= cutoff or len(heap) > self.max_buffer):
+                _, _, _, pod_name, timestamp, text = heapq.heappop(heap)
+                yield (format_line(pod_name, timestamp, text) + "\n").encode("utf-8")
+        while heap:
+            _, _, _, pod_name, timestamp, text = heapq.heappop(heap)
+            yield (format_line(pod_name, timestamp, text) + "\n").encode("utf-8")
+
+    def close(self):
+        self.closed = True
+        for response in self.responses.values():
+            try:
+                response.close()
+            except Exception:
+                pass
@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Unit tests import backend modules the way app.py does (core.*, providers.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_server(server_id, cpus=4, status="Online"):
+    return {
+        "id": server_id, "name": server_id, "type": "kubernetes", "status": status,
+        "connection_coordinates": {"method": "kubeconfig", "kubeconfig_data": {"server": server_id}},
+        "resources": {
+            "total": {"cpus": cpus, "ram_gb": 8, "storage_gb": 50, "gpus": 0},
+            "allocated": {"cpus": 0, "ram_gb": 0, "storage_gb": 0, "gpus": 0},
+            "available": {"cpus": cpus, "ram_gb": 8, "storage_gb": 50, "gpus": 0},
+        },
+        "pods": [],
+    }
+
+
+@pytest.fixture
+def master_path(tmp_path):
+    """A master.json with two online servers, s0 and s1."""
+    path = tmp_path / "master.json"
+    path.write_text(json.dumps({"servers": [make_server("s0"), make_server("s1")], "config": {}}))
+    return str(path)
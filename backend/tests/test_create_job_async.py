@@ -0,0 +1,78 @@
+import requests
+import time
+
+BASE_URL = "http://localhost:5006"
+
+def test_async_create():
+    print("--- Testing Async Pod Creation ---")
+
+    # 1. Get a server
+    print("Fetching servers...")
+    try:
+        res = requests.get(f"{BASE_URL}/servers")
+    except Exception as e:
+        print(f"Connection Failed: {e}")
+        return
+    if not res.ok:
+        print(f"Failed to fetch servers: {res.text}")
+        return
+
+    servers = res.json()
+    if not servers:
+        print("No servers found. Please ensure master.json has data.")
+        return
+
+    server_id = servers[0]["id"]
+    pod_id = "test-pod-job"
+    print(f"Targeting Server: {server_id}")
+
+    # 2. Submit create job
+    payload = {
+        "server_id": server_id,
+        "pod_id": pod_id,
+        "image_url": "nginx:latest",
+        "requested": {"cpus": 0.1, "ram_gb": 0.2},
+        "wait": False
+    }
+    start_time = time.time()
+    res = requests.post(f"{BASE_URL}/create", json=payload)
+    duration = time.time() - start_time
+    if res.status_code != 202:
+        print(f"Expected 202, got {res.status_code}: {res.text}")
+        return
+
+    job_id = res.json().get("job_id")
+    print(f"Job accepted in {duration:.2f}s. Job ID: {job_id}")
+
+    # 3. Poll job status
+    completed = False
+    attempts = 0
+    max_attempts = 75 # 2.5 minutes
+
+    while not completed and attempts < max_attempts:
+        time.sleep(2)
+        attempts += 1
+
+        job_res = requests.get(f"{BASE_URL}/jobs/{job_id}")
+        if not job_res.ok:
+            print(f"Error polling job: {job_res.text}")
+            break
+
+        job = job_res.json()
+        print(f"[Attempt {attempts}] Status: {job.get('status')} | Stages: {job.get('stages')}")
+
+        if job.get("status") in ["success", "error"]:
+            completed = True
+            print(f"Job completed with status: {job.get('status')}")
+            print(f"Result: {job.get('result')}")
+
+    if not completed:
+        print("Timed out waiting for job to complete.")
+        return
+
+    # 4. Clean up
+    res = requests.post(f"{BASE_URL}/delete", json={"server_id": server_id, "pod_id": pod_id})
+    print(f"Cleanup delete: {res.status_code}")
+
+if __name__ == "__main__":
+    test_async_create()
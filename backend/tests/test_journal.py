@@ -0,0 +1,97 @@
+import json
+import shutil
+
+from core.journal import MutationJournal
+from core.state_store import StateStore
+from core.storage import JsonStorage
+
+
+def add_pod(store, pod_id, cpus=1):
+    store.commit({"op": "pod_added", "server_id": "s0", "pod": {"pod_id": pod_id, "requested": {"cpus": cpus}}})
+
+
+def pod_ids(store):
+    return [pod["pod_id"] for pod in store.get_server("s0")["pods"]]
+
+
+def test_journal_is_replayed_after_restart(master_path):
+    store = StateStore(master_path)
+    add_pod(store, "a")
+    add_pod(store, "b")
+    store.commit({"op": "pod_removed", "server_id": "s0", "pod_id": "a"})
+    store.backend.close()
+
+    # Nothing compacted yet: the snapshot is untouched and the journal holds the entries
+    with open(master_path) as f:
+        assert json.load(f)["servers"][0]["pods"] == []
+    restarted = StateStore(master_path)
+    assert pod_ids(restarted) == ["b"]
+    assert restarted.get_server("s0")["resources"]["available"]["cpus"] == 3
+
+
+def test_entries_folded_into_the_snapshot_are_skipped(master_path):
+    store = StateStore(master_path, backend=JsonStorage(master_path))
+    add_pod(store, "a")
+    add_pod(store, "b")
+    # A crash between writing the snapshot and emptying the journal leaves both
+    shutil.copy(master_path + ".journal", master_path + ".stale")
+    store.save()
+    with open(master_path) as f:
+        assert json.load(f)["journal_seq"] == 2
+    shutil.copy(master_path + ".stale", master_path + ".journal")
+
+    config, entries = JsonStorage(master_path).load()
+    assert entries == []
+    assert [pod["pod_id"] for pod in config["servers"][0]["pods"]] == ["a", "b"]
+
+    # Entries after the snapshot's seq are still replayed, numbered on from it
+    restarted = StateStore(master_path)
+    add_pod(restarted, "c")
+    config, entries = JsonStorage(master_path).load()
+    assert [(e["seq"], e["pod"]["pod_id"]) for e in entries] == [(3, "c")]
+    assert pod_ids(StateStore(master_path)) == ["a", "b", "c"]
+
+
+def test_torn_trailing_line_is_dropped(master_path):
+    store = StateStore(master_path)
+    add_pod(store, "a")
+    store.backend.close()
+    journal_path = master_path + ".journal"
+    with open(journal_path) as f:
+        valid = f.read()
+    with open(journal_path, "a") as f:
+        f.write('{"seq":2,"op":"pod_added","server_id":"s0","pod":{"pod_id":"tor')
+
+    restarted = StateStore(master_path)
+    assert pod_ids(restarted) == ["a"]
+    with open(journal_path) as f:
+        assert f.read() == valid
+
+    # The next append starts on a clean line
+    add_pod(restarted, "b")
+    assert pod_ids(StateStore(master_path)) == ["a", "b"]
+
+
+def test_read_from_stops_at_an_incomplete_line(tmp_path):
+    journal = MutationJournal(str(tmp_path / "journal"))
+    journal.append({"seq": 1})
+    journal.flush()
+    with open(journal.path, "a") as f:
+        f.write('{"seq": 2')
+    entries, end = journal.read_from(0)
+    assert entries == [{"seq": 1}]
+    assert end == len('{"seq":1}\n')
+
+
+def test_other_stores_catch_up_with_new_entries(master_path):
+    writer = StateStore(master_path, shared=True)
+    reader = StateStore(master_path, shared=True)
+    add_pod(writer, "a")
+    assert reader.refresh_if_changed()
+    assert pod_ids(reader) == ["a"]
+
+    # After a compaction the reader reloads the snapshot instead
+    writer.save()
+    add_pod(writer, "b")
+    assert reader.refresh_if_changed()
+    assert pod_ids(reader) == ["a", "b"]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from providers.k8s_informer import ClusterInformer
+from providers.k8s_provider import K8sProvider
+
+
+def make_provider():
+    provider = K8sProvider()
+    provider.core_v1 = mock.MagicMock()
+    provider.apps_v1 = mock.MagicMock()
+    provider.networking_v1 = mock.MagicMock()
+    # A running, synced informer, as ServerManager starts by default
+    provider.informer = ClusterInformer(provider.core_v1)
+    provider.informer.pods.synced.set()
+    return provider
+
+
+def ready_pod(node_name="node-1"):
+    return SimpleNamespace(status=SimpleNamespace(pod_ip="10.0.0.5"),
+                           spec=SimpleNamespace(node_name=node_name))
+
+
+def test_synced_is_none_for_kinds_that_are_not_cached():
+    provider = make_provider()
+    assert provider._synced("pods") is provider.informer.pods
+    assert provider._synced("namespaces") is None
+    assert provider._synced("nodes") is None
+
+
+def test_create_pod_with_informer_reads_namespace_and_node_from_api():
+    provider = make_provider()
+    provider.core_v1.read_node.return_value = SimpleNamespace(status=SimpleNamespace(
+        addresses=[SimpleNamespace(type="InternalIP", address="10.1.1.1"),
+                   SimpleNamespace(type="ExternalIP", address="203.0.113.7")]))
+    with mock.patch.object(provider, "_wait_for", return_value=ready_pod()):
+        result = provider.create_pod({"pod_id": "web", "namespace": "team-a", "requested": {"cpus": 1}})
+
+    assert result["status"] == "success", result
+    assert result["pod_ip"] == "10.0.0.5"
+    assert result["external_ip"] == "203.0.113.7"
+    provider.core_v1.read_namespace.assert_called_once()
+    provider.core_v1.read_node.assert_called_once()
+    provider.core_v1.create_namespace.assert_not_called()
+
+
+def test_create_pod_creates_a_missing_namespace():
+    provider = make_provider()
+    provider.core_v1.read_namespace.side_effect = RuntimeError("not found")
+    with mock.patch.object(provider, "_wait_for", return_value=ready_pod(node_name=None)):
+        result = provider.create_pod({"pod_id": "web", "namespace": "team-b"})
+
+    assert result["status"] == "success", result
+    assert result["external_ip"] == "10.0.0.5"
+    provider.core_v1.create_namespace.assert_called_once()
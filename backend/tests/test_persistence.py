@@ -0,0 +1,38 @@
+import json
+import os
+import stat
+
+from core.persistence import atomic_write_json
+from core.state_store import StateStore
+
+
+def mode_of(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_atomic_write_keeps_the_existing_mode(tmp_path):
+    path = tmp_path / "master.json"
+    path.write_text("{}")
+    os.chmod(path, 0o644)
+    atomic_write_json(str(path), {"a": 1})
+    assert mode_of(path) == 0o644
+    assert json.loads(path.read_text()) == {"a": 1}
+
+    os.chmod(path, 0o640)
+    atomic_write_json(str(path), {"a": 2})
+    assert mode_of(path) == 0o640
+
+
+def test_atomic_write_creates_files_with_the_umask(tmp_path):
+    umask = os.umask(0)
+    os.umask(umask)
+    path = tmp_path / "new.json"
+    atomic_write_json(str(path), {})
+    assert mode_of(path) == 0o666 & ~umask
+
+
+def test_compaction_keeps_master_json_readable(master_path):
+    os.chmod(master_path, 0o644)
+    store = StateStore(master_path)
+    store.save()
+    assert mode_of(master_path) == 0o644
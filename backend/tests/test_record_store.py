@@ -0,0 +1,82 @@
+import os
+import time
+import uuid
+
+from core.job_manager import JobManager
+from core.persistence import RecordStore
+from core.server_manager import ScanManager
+
+
+def test_evicts_oldest_finished_records_over_the_limit(tmp_path):
+    records = RecordStore("job", max_records=2, archive_dir=str(tmp_path))
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    for record_id in ids:
+        records.add(record_id, {"id": record_id, "status": "running"})
+    # Nothing has finished: live records are never evicted
+    assert len(records.by_id) == 3
+
+    for record_id in ids:
+        records.by_id[record_id]["status"] = "success"
+        records.archive(records.by_id[record_id])
+        records.finish(record_id)
+    assert list(records.by_id) == ids[1:]
+    assert records.load_archived(ids[0]) == {"id": ids[0], "status": "success", "archived": True}
+
+
+def test_expired_records_are_evicted(tmp_path):
+    records = RecordStore("scan", ttl=0)
+    records.add("a", {"id": "a"})
+    records.finish("a")
+    assert records.by_id == {}
+
+
+def test_archive_ids_must_be_uuids(tmp_path):
+    records = RecordStore("scan", archive_dir=str(tmp_path))
+    assert records.load_archived("../master") is None
+    assert records.load_archived(None) is None
+
+
+def test_old_archive_files_are_pruned_at_start(tmp_path):
+    old = tmp_path / f"{uuid.uuid4()}.json"
+    old.write_text("{}")
+    os.utime(old, (0, 0))
+    RecordStore("scan", archive_dir=str(tmp_path))
+    assert not old.exists()
+
+
+def test_managers_read_evicted_records_back_from_the_archive(tmp_path):
+    jobs = JobManager(max_workers=1, max_jobs=1, archive_dir=str(tmp_path / "jobs"))
+    job_ids = [jobs.submit("noop", lambda job_id, n: {"n": n}, n) for n in range(2)]
+    jobs.executor.shutdown(wait=True)
+    scans = ScanManager(max_scans=1, archive_dir=str(tmp_path / "scans"))
+    scan_ids = [scans.create_scan("nginx:latest") for _ in range(2)]
+    for scan_id in scan_ids:
+        scans.complete_scan(scan_id, {"total": 0})
+
+    assert list(jobs.jobs) == job_ids[1:]
+    assert jobs.get_job(job_ids[0])["result"] == {"n": 0}
+    assert jobs.get_job(job_ids[0])["archived"] is True
+    assert list(scans.scans) == scan_ids[1:]
+    assert scans.get_scan(scan_ids[0])["archived"] is True
+
+
+def test_archive_is_pruned_while_running_and_capped(tmp_path):
+    records = RecordStore("scan", archive_dir=str(tmp_path), max_archived=2, prune_interval=0)
+    ids = [str(uuid.uuid4()) for _ in range(4)]
+    for n, record_id in enumerate(ids):
+        records.archive({"id": record_id})
+        os.utime(tmp_path / f"{record_id}.json", (n, time.time() - 100 + n))
+    expired = tmp_path / f"{uuid.uuid4()}.json"
+    expired.write_text("{}")
+    os.utime(expired, (0, 0))
+
+    records.archive({"id": ids[-1]})
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{record_id}.json" for record_id in ids[-2:])
+
+
+def test_cache_hit_scans_are_not_archived(tmp_path):
+    scans = ScanManager(archive_dir=str(tmp_path))
+    trivy_run, cache_hit = scans.create_scan("nginx:latest"), scans.create_scan("nginx:latest")
+    scans.complete_scan(trivy_run, {"total": 0})
+    scans.complete_scan(cache_hit, {"total": 0, "cached": True}, archive=False)
+    assert os.listdir(tmp_path) == [f"{trivy_run}.json"]
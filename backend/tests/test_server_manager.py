@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import core.server_manager as server_manager
+from core.state_store import StateStore
+
+
+class FakeProvider:
+    """Stands in for K8sProvider: every create and delete succeeds."""
+
+    def __init__(self, kubeconfig_data=None):
+        self.created = []
+        self.deleted = []
+
+    def start_informer(self):
+        pass
+
+    def close(self):
+        pass
+
+    def create_pod(self, pod_data, progress_callback=None):
+        self.created.append(pod_data["pod_id"])
+        return {"status": "success", "pod_ip": "10.0.0.5", "external_ip": "10.0.0.5"}
+
+    def delete_pod(self, namespace, name, propagation_policy=None):
+        self.deleted.append(name)
+        return True
+
+    def running_image_id(self, namespace, deployment_name):
+        return None
+
+
+@pytest.fixture
+def manager(master_path, monkeypatch):
+    monkeypatch.setattr(server_manager, "K8sProvider", FakeProvider)
+    return server_manager.ServerManager(master_path, use_informers=False)
+
+
+def available_cpus(manager, server_id):
+    return manager.store.get_server(server_id)["resources"]["available"]["cpus"]
+
+
+def test_create_rejects_a_pod_id_already_on_the_server(manager):
+    first = manager.create_pod("s0", {"pod_id": "dup", "resources": {"cpus": 0.5}})
+    assert first["status"] == "success", first
+
+    second = manager.create_pod("s0", {"pod_id": "dup", "resources": {"cpus": 0.5}})
+    assert "already exists" in second["error"]
+    assert len(manager.store.get_server("s0")["pods"]) == 1
+    assert available_cpus(manager, "s0") == 3.5
+
+    assert manager.delete_pod("s0", "dup") == {"message": "Pod deleted successfully"}
+    assert manager.store.get_server("s0")["pods"] == []
+    assert available_cpus(manager, "s0") == 4
+
+
+def test_same_pod_id_on_another_server_is_allowed(manager):
+    assert manager.create_pod("s0", {"pod_id": "web", "resources": {"cpus": 1}})["status"] == "success"
+    assert manager.create_pod("s1", {"pod_id": "web", "resources": {"cpus": 1}})["status"] == "success"
+
+
+def test_pod_added_replaces_a_record_with_the_same_id(master_path):
+    store = StateStore(master_path)
+    for cpus in (0.5, 1):
+        store.commit({"op": "pod_added", "server_id": "s0",
+                      "pod": {"pod_id": "dup", "requested": {"cpus": cpus}}})
+
+    pods = store.get_server("s0")["pods"]
+    assert [pod["requested"]["cpus"] for pod in pods] == [1]
+    assert store.get_server("s0")["resources"]["available"]["cpus"] == 3
+
+    # Replaying the journal gives the same result
+    reloaded = StateStore(master_path)
+    assert len(reloaded.get_server("s0")["pods"]) == 1
+    assert reloaded.get_server("s0")["resources"]["available"]["cpus"] == 3
+
+
+def test_placement_and_explicit_server_check_the_same_resources(manager):
+    too_much_storage = {"pod_id": "big", "resources": {"cpus": 1, "storage_gb": 80}}
+    placed = manager.create_pod(None, dict(too_much_storage))
+    explicit = manager.create_pod("s0", dict(too_much_storage))
+
+    assert "Insufficient resources" in placed["error"]
+    assert "storage_gb" in explicit["error"]
+    assert manager.store.get_server("s0")["pods"] == []
+
+
+def wait_for_job(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    job = manager.job_manager.get_job(job_id)
+    while job["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+        job = manager.job_manager.get_job(job_id)
+    return job
+
+
+def test_fleet_scan_where_every_image_failed_is_an_error(manager, tmp_path, monkeypatch):
+    for n in range(2):
+        created = manager.create_pod("s0", {"pod_id": f"web-{n}", "image_url": f"example/web-{n}:1",
+                                            "resources": {"cpus": 0.1}})
+        assert created["status"] == "success", created
+    # No trivy binary on PATH: the DB download and every scan fail
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    job = wait_for_job(manager, manager.scan_fleet()["job_id"])
+
+    assert job["status"] == "error"
+    assert job["result"]["images"] == 2
+    assert job["result"]["scanned"] == 0
+    assert job["result"]["failed"] == 2
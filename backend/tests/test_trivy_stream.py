@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from core.trivy_stream import TrivyReportParser
+
+
+def vuln(n, severity):
+    return {"VulnerabilityID": f"CVE-2024-{n}", "PkgName": f"pkg{n % 3}", "InstalledVersion": "1.0",
+            "Severity": severity, "Title": f'vuln {n} with "quotes", {{braces}} and [brackets]'}
+
+
+SEVERITIES = ["LOW", "CRITICAL", "MEDIUM", "HIGH", "UNKNOWN", "CRITICAL", "LOW", "HIGH"]
+REPORT = {
+    "SchemaVersion": 2,
+    "ArtifactName": "example/web:1",
+    "Metadata": {"RepoDigests": ["example/web@sha256:abc"], "ImageConfig": {"history": [{"x": [1, 2]}]}},
+    "Results": [
+        {"Target": "os", "Vulnerabilities": [vuln(n, s) for n, s in enumerate(SEVERITIES[:5])]},
+        {"Target": "empty", "Vulnerabilities": []},
+        {"Target": "no-vulns"},
+        {"Target": "lang", "Vulnerabilities": [vuln(n, s) for n, s in enumerate(SEVERITIES[5:], start=5)]},
+    ],
+}
+EXPECTED_SUMMARY = {"Critical": 2, "High": 2, "Medium": 1, "Low": 2, "Unknown": 1}
+
+
+def parse(text, chunk_size=None, **kwargs):
+    parser = TrivyReportParser(**kwargs)
+    chunk_size = chunk_size or len(text)
+    for i in range(0, len(text), chunk_size):
+        parser.feed(text[i:i + chunk_size])
+    parser.close()
+    return parser
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, None])
+def test_chunks_split_anywhere_give_the_same_result(chunk_size):
+    parser = parse(json.dumps(REPORT, indent=2), chunk_size)
+
+    assert parser.summary == EXPECTED_SUMMARY
+    assert parser.total == 8
+    assert parser.repo_digests == ["example/web@sha256:abc"]
+    assert [v["id"] for v in parser.vulnerabilities()] == [
+        "CVE-2024-1", "CVE-2024-5", "CVE-2024-3", "CVE-2024-7",
+        "CVE-2024-2", "CVE-2024-0", "CVE-2024-6", "CVE-2024-4"]
+    assert parser.vulnerabilities()[0]["title"] == vuln(1, "CRITICAL")["Title"]
+
+
+def test_notices_before_the_document_are_skipped():
+    text = "2024-01-01T00:00:00Z INFO Need to update DB\nDownloading...\n" + json.dumps(REPORT)
+    assert parse(text, chunk_size=5).summary == EXPECTED_SUMMARY
+
+
+def test_old_array_format():
+    parser = parse(json.dumps(REPORT["Results"]), chunk_size=3)
+    assert parser.summary == EXPECTED_SUMMARY
+    assert parser.repo_digests == []
+
+
+def test_keeps_only_the_most_severe_entries():
+    parser = parse(json.dumps(REPORT), max_vulnerabilities=3)
+    kept = parser.vulnerabilities()
+    # Both criticals, then the first high in report order
+    assert [(v["id"], v["severity"]) for v in kept] == [
+        ("CVE-2024-1", "Critical"), ("CVE-2024-5", "Critical"), ("CVE-2024-3", "High")]
+    assert parser.total == 8
+
+
+def test_zero_kept_entries_still_counts():
+    parser = parse(json.dumps(REPORT), max_vulnerabilities=0)
+    assert parser.vulnerabilities() == []
+    assert parser.summary == EXPECTED_SUMMARY
+
+
+def test_collects_distinct_findings():
+    parser = parse(json.dumps(REPORT), collect_findings=True)
+    assert ("CVE-2024-1", "pkg1", "1.0", "Critical") in parser.findings
+    assert len(parser.findings) == 8
+
+
+@pytest.mark.parametrize("cut", [0.3, 0.6, 0.99])
+def test_truncated_output_is_an_error(cut):
+    text = json.dumps(REPORT)
+    parser = TrivyReportParser()
+    parser.feed(text[:int(len(text) * cut)])
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_output_without_json_is_an_error():
+    parser = TrivyReportParser()
+    parser.feed("FATAL: unable to initialize the scanner\n")
+    with pytest.raises(ValueError, match="no JSON document"):
+        parser.close()
+
+
+def test_partial_counts_while_streaming():
+    text = json.dumps(REPORT)
+    parser = TrivyReportParser()
+    parser.feed(text[:text.index('"Target": "lang"')])
+    assert parser.partial() == {"summary": {"Critical": 1, "High": 1, "Medium": 1, "Low": 1, "Unknown": 1},
+                                "total": 5}
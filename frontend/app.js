@@ -71,6 +71,7 @@ createApp({
         const logs = ref('');
         const logPodId = ref(null);
         const logInterval = ref(null);
+        const logSource = ref(null);
         const logContainer = ref(null);
 
         // Security Scan State
@@ -78,6 +79,9 @@ createApp({
         const scanning = ref(false);
         const scanResult = ref(null);
         const scanLogs = ref([]);
+        const scanPartial = ref(null);
+        const scanQueuePosition = ref(null);
+        const scanSource = ref(null);
         const scanInterval = ref(null);
 
         // --- Methods ---
@@ -146,7 +150,8 @@ createApp({
                     image_url: newPod.value.image_url,
                     namespace: newPod.value.namespace || null,
                     route: newPod.value.route || null,
-                    requested: newPod.value.requested
+                    requested: newPod.value.requested,
+                    wait: false // Provisioned in the background, tracked via /jobs
                 };
 
                 const res = await fetch(`${API_base}/create`, {
@@ -156,9 +161,10 @@ createApp({
                 });
 
                 if (res.ok) {
+                    const { job_id } = await res.json();
                     showCreateModal.value = false;
                     fetchData(); // Immediate refresh
-                    // Note: Polling will catch the 'provisioning' state shortly
+                    watchJob(job_id);
                 } else {
                     alert('Creation failed: ' + await res.text());
                 }
@@ -169,6 +175,29 @@ createApp({
             }
         };
 
+        const watchJob = (jobId) => {
+            // Refresh once the background provisioning job finishes
+            const timer = setInterval(async () => {
+                try {
+                    const res = await fetch(`${API_base}/jobs/${jobId}`);
+                    if (!res.ok) {
+                        clearInterval(timer);
+                        return;
+                    }
+                    const job = await res.json();
+                    if (job.status === 'success' || job.status === 'error') {
+                        clearInterval(timer);
+                        fetchData();
+                        if (job.status === 'error') {
+                            alert(`Creation of ${job.pod_id} failed: ` + (job.result?.message || job.result?.error || 'Unknown error'));
+                        }
+                    }
+                } catch (e) {
+                    console.error("Job polling error", e);
+                }
+            }, 2000);
+        };
+
         const updatePod = async (pod) => {
             if (!pod._editingImage || pod._editingImage === pod.image_url) return;
 
@@ -227,45 +256,156 @@ createApp({
             }
         };
 
+        const logCursor = ref(null);
+
         const fetchLogs = async () => {
             if (!logPodId.value || !selectedServerId.value) return;
             try {
-                const res = await fetch(`${API_base}/logs?server_id=${selectedServerId.value}&pod_id=${logPodId.value}`);
+                // Only ask for lines newer than the last timestamp we have seen
+                const since = logCursor.value ? `&since=${encodeURIComponent(logCursor.value)}` : '';
+                const res = await fetch(`${API_base}/logs/since?server_id=${selectedServerId.value}&pod_id=${logPodId.value}${since}`);
                 if (res.ok) {
-                    logs.value = await res.text();
-                    // Auto-scroll to bottom
-                    Vue.nextTick(() => {
-                        if (logContainer.value) {
-                            logContainer.value.scrollTop = logContainer.value.scrollHeight;
-                        }
-                    });
+                    const data = await res.json();
+                    const lines = data.lines || [];
+                    if (!logCursor.value || data.truncated) {
+                        logs.value = lines.join('\n');
+                    } else if (lines.length) {
+                        logs.value = logs.value ? `${logs.value}\n${lines.join('\n')}` : lines.join('\n');
+                    }
+                    logCursor.value = data.cursor || logCursor.value;
+                    if (lines.length) {
+                        // Auto-scroll to bottom
+                        scrollLogs();
+                    }
                 }
             } catch (e) {
                 console.error("error fetching logs", e);
             }
         };
 
+        const scrollLogs = () => {
+            Vue.nextTick(() => {
+                if (logContainer.value) {
+                    logContainer.value.scrollTop = logContainer.value.scrollHeight;
+                }
+            });
+        };
+
+        const MAX_LOG_LINES = 2000;
+
+        const streamLogs = () => {
+            const url = `${API_base}/logs/stream?server_id=${selectedServerId.value}&pod_id=${logPodId.value}`;
+            const source = new EventSource(url);
+            let lines = [];
+            // The server replays recent lines on every (re)connect, so start fresh each time
+            source.onopen = () => { lines = []; };
+            source.onmessage = (event) => {
+                lines.push(event.data);
+                if (lines.length > MAX_LOG_LINES) lines.splice(0, lines.length - MAX_LOG_LINES);
+                logs.value = lines.join('\n');
+                scrollLogs();
+            };
+            source.addEventListener('end', (event) => {
+                source.close();
+                logs.value += `\n[stream closed${event.data ? ': ' + event.data : ''}]`;
+            });
+            logSource.value = source;
+        };
+
         const showLogs = (pod) => {
             logPodId.value = pod.pod_id;
             logs.value = 'Connecting to container stream...';
             showLogsModal.value = true;
-            fetchLogs();
-            logInterval.value = setInterval(fetchLogs, 3000);
+            if (window.EventSource) {
+                streamLogs();
+            } else {
+                logCursor.value = null;
+                fetchLogs();
+                logInterval.value = setInterval(fetchLogs, 3000);
+            }
         };
 
         const closeLogs = () => {
             showLogsModal.value = false;
+            if (logSource.value) {
+                logSource.value.close();
+                logSource.value = null;
+            }
             if (logInterval.value) {
                 clearInterval(logInterval.value);
                 logInterval.value = null;
             }
             logPodId.value = null;
+            logCursor.value = null;
             logs.value = '';
         };
 
+        const MAX_SCAN_LOG_LINES = 500;
+
+        const appendScanLogs = (lines) => {
+            if (!lines || !lines.length) return;
+            scanLogs.value = scanLogs.value.concat(lines).slice(-MAX_SCAN_LOG_LINES);
+        };
+
+        const applyScanProgress = (data) => {
+            scanQueuePosition.value = data.status === 'queued' ? (data.queue_position ?? '?') : null;
+            scanPartial.value = data.partial || null;
+        };
+
+        const stopScanUpdates = () => {
+            if (scanSource.value) {
+                scanSource.value.close();
+                scanSource.value = null;
+            }
+            if (scanInterval.value) {
+                clearInterval(scanInterval.value);
+                scanInterval.value = null;
+            }
+        };
+
+        const finishScan = (result) => {
+            stopScanUpdates();
+            scanning.value = false;
+            scanQueuePosition.value = null;
+            scanResult.value = result || { error: 'Unknown error' };
+        };
+
+        // The server pushes only new log lines; a reconnect resumes from the last event id
+        const streamScan = (scanId) => {
+            const source = new EventSource(`${API_base}/scan/stream?scan_id=${scanId}`);
+            source.onmessage = (event) => appendScanLogs([event.data]);
+            source.addEventListener('progress', (event) => applyScanProgress(JSON.parse(event.data)));
+            source.addEventListener('result', (event) => finishScan(JSON.parse(event.data).result));
+            scanSource.value = source;
+        };
+
+        // Fallback without EventSource: poll, asking only for lines after the ones we have
+        const pollScan = (scanId) => {
+            let offset = 0;
+            scanInterval.value = setInterval(async () => {
+                try {
+                    const statusRes = await fetch(`${API_base}/scan/status?scan_id=${scanId}&offset=${offset}`);
+                    if (statusRes.ok) {
+                        const data = await statusRes.json();
+                        appendScanLogs(data.logs);
+                        offset = data.next_offset;
+                        applyScanProgress(data);
+                        if (data.status === 'success' || data.status === 'error') {
+                            finishScan(data.result);
+                        }
+                    }
+                } catch (e) {
+                    console.error("Polling error", e);
+                }
+            }, 2000);
+        };
+
         const scanPod = async (pod) => {
+            stopScanUpdates();
             scanResult.value = { image: pod.image_url };
             scanLogs.value = [];
+            scanPartial.value = null;
+            scanQueuePosition.value = null;
             showSecurityModal.value = true;
             scanning.value = true;
 
@@ -276,25 +416,12 @@ createApp({
 
                 const { scan_id } = await res.json();
 
-                // 2. Poll for status
-                scanInterval.value = setInterval(async () => {
-                    try {
-                        const statusRes = await fetch(`${API_base}/scan/status?scan_id=${scan_id}`);
-                        if (statusRes.ok) {
-                            const data = await statusRes.json();
-                            scanLogs.value = data.logs;
-
-                            if (data.status === 'success' || data.status === 'error') {
-                                clearInterval(scanInterval.value);
-                                scanInterval.value = null;
-                                scanning.value = false;
-                                scanResult.value = data.result || { error: 'Unknown error' };
-                            }
-                        }
-                    } catch (e) {
-                        console.error("Polling error", e);
-                    }
-                }, 2000);
+                // 2. Follow progress
+                if (window.EventSource) {
+                    streamScan(scan_id);
+                } else {
+                    pollScan(scan_id);
+                }
 
             } catch (e) {
                 alert('Scan initiation failed: ' + e.message);
@@ -303,6 +430,12 @@ createApp({
             }
         };
 
+        const closeScan = () => {
+            stopScanUpdates();
+            showSecurityModal.value = false;
+            scanning.value = false;
+        };
+
         // --- Lifecycle ---
         onMounted(() => {
             fetchData();
@@ -344,7 +477,10 @@ createApp({
             scanning,
             scanResult,
             scanLogs,
-            scanPod
+            scanPartial,
+            scanQueuePosition,
+            scanPod,
+            closeScan
         };
     }
 }).mount('#app');